@@ -0,0 +1,180 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from Config import (
+    ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_VERSION_TTL,
+)
+import Metrics
+from Search import _embed, corpus_version
+
+
+def fragments_key(chunks: list[dict]) -> str:
+    """Order-independent digest of the retrieved fragments (document + text)."""
+    parts = sorted(f"{c['id_document']}\x1f{c['texte_fragment']}" for c in chunks)
+    return hashlib.sha256("\x1e".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers, stored in SQLite.
+
+    A cached answer is served when the language and the retrieved fragment
+    set match exactly and the question embedding is within `threshold`
+    cosine similarity of the cached question. Entries are tagged with the
+    corpus version (Search.corpus_version) and purged when ingestion
+    changes the corpus.
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 version_ttl: float = ANSWER_CACHE_VERSION_TTL):
+        self.path        = path
+        self.threshold   = threshold
+        self.max_entries = max_entries
+        self.version_ttl = version_ttl
+        self._lock       = threading.Lock()
+        self._version    = None
+        self._version_at = 0.0
+        self.hits = self.misses = 0
+        self.saved_seconds  = 0.0      # generation time the hits did not spend
+        self.lookup_seconds = 0.0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")   # several Streamlit processes may share it
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id             INTEGER PRIMARY KEY,
+                lang           TEXT NOT NULL,
+                fragments_key  TEXT NOT NULL,
+                corpus_version TEXT NOT NULL,
+                question       TEXT NOT NULL,
+                embedding      BLOB NOT NULL,
+                answer         TEXT NOT NULL,
+                gen_seconds    REAL NOT NULL,
+                created_at     REAL NOT NULL,
+                last_hit       REAL NOT NULL,
+                hits           INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_lookup_idx "
+                         "ON answers (lang, fragments_key, corpus_version)")
+        self._db.commit()
+
+    # ── Corpus version ──
+    def corpus_version(self) -> str:
+        """Current corpus version, re-read at most every `version_ttl` seconds."""
+        now = time.monotonic()
+        if self._version is None or now - self._version_at > self.version_ttl:
+            version = corpus_version()
+            with self._lock:
+                if version != self._version:
+                    deleted = self._db.execute("DELETE FROM answers WHERE corpus_version != ?",
+                                               (version,)).rowcount
+                    self._db.commit()
+                    if deleted:
+                        print(f"[AnswerCache] Corpus changed — {deleted} answers invalidated.")
+                self._version, self._version_at = version, now
+        return self._version
+
+    # ── Lookup / store ──
+    def get(self, question: str, chunks: list[dict], lang: str) -> str | None:
+        t0 = time.perf_counter()
+        version = self.corpus_version()
+        query   = _unit(_embed(question))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, embedding, answer, gen_seconds FROM answers "
+                "WHERE lang = ? AND fragments_key = ? AND corpus_version = ?",
+                (lang, fragments_key(chunks), version)).fetchall()
+            best = None
+            for row_id, blob, answer, gen_seconds in rows:
+                similarity = float(np.frombuffer(blob, dtype=np.float32) @ query)
+                if similarity >= self.threshold and (best is None or similarity > best[0]):
+                    best = (similarity, row_id, answer, gen_seconds)
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.saved_seconds += best[3]
+                self._db.execute("UPDATE answers SET hits = hits + 1, last_hit = ? WHERE id = ?",
+                                 (time.time(), best[1]))
+                self._db.commit()
+            self.lookup_seconds += time.perf_counter() - t0
+        result = "miss" if best is None else "hit"
+        Metrics.inc("rag_answer_cache_total", result=result)
+        if best is not None:
+            Metrics.inc("rag_answer_cache_saved_seconds_total", best[3])
+        trace = Metrics.current_trace()
+        if trace is not None:
+            trace.annotate(answer_cache=result)
+        return best[2] if best else None
+
+    def put(self, question: str, chunks: list[dict], lang: str,
+            answer: str, gen_seconds: float):
+        version = self.corpus_version()
+        vector  = _unit(_embed(question))
+        now     = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO answers (lang, fragments_key, corpus_version, question, embedding, "
+                "answer, gen_seconds, created_at, last_hit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (lang, fragments_key(chunks), version, question, vector.tobytes(),
+                 answer, gen_seconds, now, now))
+            # Evict the least recently used answers beyond max_entries
+            self._db.execute("""
+                DELETE FROM answers WHERE id IN (
+                    SELECT id FROM answers ORDER BY last_hit DESC LIMIT -1 OFFSET ?)
+            """, (self.max_entries,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size    = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "size":          size,
+                "hits":          self.hits,
+                "misses":        self.misses,
+                "hit_rate":      round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "avg_lookup_ms": round(1000 * self.lookup_seconds / lookups, 2) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self.hits = self.misses = 0
+            self.saved_seconds = self.lookup_seconds = 0.0
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm   = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_cache      = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache, opened on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
+
+
+def answer_cache_stats() -> dict:
+    """Hit rate and saved generation time of the answer cache."""
+    return get_answer_cache().stats()
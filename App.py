@@ -1,12 +1,25 @@
 
 
 import re
-import os
+import time
+import threading
+from contextlib import closing
 import streamlit as st
-from groq import Groq
 from dotenv import load_dotenv
 load_dotenv()
-from Search import semantic_search, test_connection
+from Search import (
+    semantic_search, infer_filters, corpus_version,
+    model_ready, get_model, _normalize_question,
+)
+from Generation import get_generator, GenerationCancelled
+from Config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_VERSION_TTL, DEBUG_PANEL, TOP_K, CONTEXT_CANDIDATES,
+    READY_PRECOMPUTE_EXAMPLES,
+)
+from AnswerCache import get_answer_cache, answer_cache_stats
+from Context import pack_context, format_context, estimate_tokens
+import Metrics
+import Readiness
 
 
 TRANSLATIONS = {
@@ -19,10 +32,13 @@ TRANSLATIONS = {
         "btn_search":    "🔍  Rechercher",
         "btn_examples":  "💡 Exemples",
         "db_error":      "❌ Connexion à la base de données impossible. Vérifiez `Config.py`.",
+        "db_degraded":   "⚠️ Service dégradé (index ou corpus manquant) : les réponses peuvent être lentes ou vides.",
         "no_result":     "😕 Aucun résultat trouvé.<br><small>Essayez de reformuler votre question.</small>",
         "warn_empty":    "⚠️ Veuillez entrer une question.",
+        "spinner_model": "⏳ Chargement du modèle d'embedding (premier lancement)…",
         "spinner_search":"🔍 Recherche des fragments pertinents…",
         "spinner_answer":"🤖 Génération de la réponse…",
+        "debug_title":   "⏱️ Détail des temps de cette question",
         "ai_section":    "🤖 Réponse générée",
         "ai_header":     "🥐 Réponse basée sur les fiches techniques",
         "src_section":   "📚 Fragments sources",
@@ -70,10 +86,13 @@ Instructions :
         "btn_search":    "🔍  بحث",
         "btn_examples":  "💡 أمثلة",
         "db_error":      "❌ تعذر الاتصال بقاعدة البيانات. تحقق من Config.py",
+        "db_degraded":   "⚠️ الخدمة متدهورة (فهرس أو مجموعة وثائق مفقودة): قد تكون الإجابات بطيئة أو فارغة.",
         "no_result":     "😕 لم يتم العثور على نتائج.<br><small>حاول إعادة صياغة سؤالك.</small>",
         "warn_empty":    "⚠️ الرجاء إدخال سؤال.",
+        "spinner_model": "⏳ جارٍ تحميل نموذج التضمين (التشغيل الأول)…",
         "spinner_search":"🔍 جارٍ البحث عن المقاطع ذات الصلة…",
         "spinner_answer":"🤖 جارٍ توليد الإجابة…",
+        "debug_title":   "⏱️ تفاصيل توقيت هذا السؤال",
         "ai_section":    "🤖 الإجابة المولَّدة",
         "ai_header":     "🥐 إجابة مستندة إلى البطاقات التقنية",
         "src_section":   "📚 المقاطع المصدرية",
@@ -121,10 +140,14 @@ if "lang" not in st.session_state:
     st.session_state.lang = "fr"
 
 T = TRANSLATIONS[st.session_state.lang]
-is_rtl = T["dir"] == "rtl"
 
 
-st.markdown(f"""
+@st.cache_data(show_spinner=False)
+def page_css(lang: str) -> str:
+    """The page stylesheet for `lang`, built once per language instead of on every rerun."""
+    T      = TRANSLATIONS[lang]
+    is_rtl = T["dir"] == "rtl"
+    return f"""
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Playfair+Display:wght@600;700&family=Source+Sans+3:wght@400;500;600&family=Noto+Naskh+Arabic:wght@400;600;700&display=swap');
 
@@ -267,7 +290,10 @@ div[data-testid="stTextArea"] textarea:focus {{
 .stButton > button:hover {{ opacity: 0.88 !important; }}
 #MainMenu, footer, header {{ visibility: hidden; }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+st.markdown(page_css(st.session_state.lang), unsafe_allow_html=True)
 
 
 col_lang = st.columns([4, 1])
@@ -286,32 +312,158 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
+def retrieve(q: str) -> tuple[list[dict], dict]:
+    """Fragments to answer `q` from and their packing report (Context.pack_context)."""
+    # A named product narrows the search to its own fragments;
+    # over-fetched candidates are narrowed down by pack_context
+    filters    = infer_filters(q)
+    candidates = semantic_search(q, top_k=CONTEXT_CANDIDATES, filters=filters,
+                                 return_vectors=True) if filters else []
+    if not candidates:
+        candidates = semantic_search(q, top_k=CONTEXT_CANDIDATES, return_vectors=True)
+    with Metrics.span("pack"):
+        return pack_context(candidates)
+
+
 @st.cache_resource
-def check_db():
-    return test_connection()
+def precomputed_results() -> dict:
+    # Process-wide: (normalized question, corpus version) → retrieve(q), filled by the warm-up
+    return {}
 
-db_ok = check_db()
-if not db_ok:
-    st.error(T["db_error"])
-    st.stop()
 
+@st.cache_resource
+def start_warmup():
+    # Once per process, in the background while the page renders: model,
+    # pooled connections, and the example questions of both languages
+    store = precomputed_results()
+
+    def precompute(q: str):
+        try:
+            version = corpus_version()
+        except Exception:
+            return []
+        results, packing = retrieve(q)
+        if results:
+            store[(_normalize_question(q), version)] = (results, packing)
+        return results
+
+    questions = [ex for lang in TRANSLATIONS.values() for ex in lang["examples"]] \
+        if READY_PRECOMPUTE_EXAMPLES else []
+    return Readiness.warm_up(questions, precompute)
+
+start_warmup()
 
-def generate_answer(question: str, chunks: list[dict], lang: str) -> str:
-    context = "\n\n".join([
-        f"Fragment {i+1}:\n{c['texte_fragment']}"
-        for i, c in enumerate(chunks)
-    ])
-    prompt = TRANSLATIONS[lang]["prompt"](context, question)
+
+@st.cache_resource
+def start_metrics():
+    # Once per process: Prometheus /metrics on METRICS_PORT (no-op when unset)
+    return Metrics.start_metrics_server()
+
+start_metrics()
+
+
+@st.cache_resource
+def check_db() -> dict:
+    # Catalog lookups only (no COUNT(*) scan): a cold process is up quickly
+    report = Readiness.check()
+    print(Readiness.describe(report))
+    return report
+
+readiness = check_db()
+if readiness["status"] == "down":
+    st.error(T["db_error"])
+    st.stop()
+elif readiness["status"] == "degraded":
+    st.warning(T["db_degraded"])
+
+
+def generate_answer(question: str, chunks: list[dict], lang: str,
+                    cancel: threading.Event | None = None, on_complete=None,
+                    packing: dict | None = None):
+    """
+    Yield the answer text piece by piece as the LLM streams it, or all at
+    once from the answer cache when a close paraphrase was already answered
+    from the same fragments. on_complete(answer) is called once the whole
+    answer is known (not for cancelled or failed generations). `chunks` are
+    sent with their packed 'context' text (Context.pack_context), whose
+    report `packing` gives the prompt tokens saved.
+    """
+    cache = None
+    if ANSWER_CACHE_ENABLED:
+        try:
+            cache = get_answer_cache()
+            with Metrics.span("answer_cache"):
+                cached = cache.get(question, chunks, lang)
+            if cached is not None:
+                yield cached
+                if on_complete is not None:
+                    on_complete(cached)
+                return
+        except Exception as e:
+            print(f"[App] ⚠️  Answer cache unavailable: {e}")
+            cache = None
+
+    prompt = TRANSLATIONS[lang]["prompt"](format_context(chunks), question)
+    saved  = packing["saved_tokens"] if packing else 0
+    Metrics.inc("rag_prompt_tokens_total", estimate_tokens(prompt), kind="sent")
+    Metrics.inc("rag_prompt_tokens_total", saved, kind="saved")
+    print(f"[App] 📦 Prompt ≈ {estimate_tokens(prompt)} tokens, {len(chunks)} fragments "
+          f"({saved} tokens saved vs the top {TOP_K} fragments in full)")
+    parts, t0 = [], time.perf_counter()
     try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=2048,
-        )
-        return response.choices[0].message.content
+        with closing(get_generator().stream(prompt, cancel)) as stream:
+            for delta in stream:
+                if not parts:
+                    Metrics.observe("llm_ttft", time.perf_counter() - t0)
+                parts.append(delta)
+                yield delta
+    except GenerationCancelled:
+        Metrics.observe("llm_total", time.perf_counter() - t0, outcome="cancelled")
+        return
     except Exception as e:
-        return f"*(Génération indisponible : {e})*"
+        Metrics.observe("llm_total", time.perf_counter() - t0, outcome="error")
+        yield f"\n\n*(Génération indisponible : {e})*"
+        return
+    Metrics.observe("llm_total", time.perf_counter() - t0, outcome="ok")
+    if on_complete is not None and parts:
+        on_complete("".join(parts))
+
+    # Only complete answers are cached
+    if cache is not None and parts:
+        try:
+            cache.put(question, chunks, lang, "".join(parts), time.perf_counter() - t0)
+        except Exception as e:
+            print(f"[App] ⚠️  Could not cache answer: {e}")
+
+
+def render_answer(slot, text: str, streaming: bool = False):
+    cursor = "▌" if streaming else ""
+    slot.markdown(f"""
+    <div class="ai-answer-box">
+        <div class="ai-answer-header">{T['ai_header']}</div>
+        <div class="ai-answer-text">{text.replace(chr(10), '<br>')}{cursor}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def render_timings(timing: Metrics.Trace):
+    """Debug panel: where the time of the current question went."""
+    total = timing.total or 1e-9
+    with st.expander(T["debug_title"]):
+        st.table([
+            {"stage": stage, "ms": round(1000 * seconds, 1), "%": round(100 * seconds / total, 1)}
+            for stage, seconds in timing.breakdown().items()
+        ] + [{"stage": "total", "ms": round(1000 * total, 1), "%": 100.0}])
+        packing = timing.fields.get("context")
+        if packing:
+            st.caption(f"context: {packing['selected']}/{packing['candidates']} fragments · "
+                       f"{packing['duplicates']} duplicates · {packing['trimmed']} trimmed · "
+                       f"≈ {packing['tokens']} tokens ({packing['saved_tokens']} saved vs top {TOP_K} in full)")
+        if ANSWER_CACHE_ENABLED:
+            cache = answer_cache_stats()
+            st.caption(f"answer cache: {cache['hits']}/{cache['hits'] + cache['misses']} hits "
+                       f"({cache['hit_rate']:.0%}) · {cache['saved_seconds']} s of generation saved · "
+                       f"{cache['size']} answers · {cache['avg_lookup_ms']} ms per lookup")
 
 
 def score_class(s): return "high" if s >= 0.75 else "medium" if s >= 0.50 else "low"
@@ -322,6 +474,118 @@ def score_label(s, T):
 def score_pct(s): return min(100, max(0, int(s * 100)))
 
 
+def result_cards_html(results: list[dict], T: dict) -> str:
+    cards = []
+    for i, result in enumerate(results, start=1):
+        sc     = result["score"]
+        cls    = score_class(sc)
+        label  = score_label(sc, T)
+        raw    = re.sub(r'\n{2,}', '\n', result["texte_fragment"]).strip()
+        text   = raw.replace("\n", "<br>")
+        doc_id = result["id_document"]
+        pct    = score_pct(sc)
+
+        cards.append(f"""
+        <div class="result-card">
+            <div class="result-card-bar bar-{cls}"></div>
+            <div class="result-card-body">
+                <div class="result-header">
+                    <div class="result-rank">
+                        <div class="rank-number">{i}</div>
+                        <span class="rank-label">{T['fragment']} {i}</span>
+                    </div>
+                    <span class="score-pill {cls}">{label}</span>
+                </div>
+                <div class="score-bar-wrap">
+                    <div class="score-bar-fill fill-{cls}" style="width:{pct}%"></div>
+                </div>
+                <div class="result-text">{text}</div>
+                <div class="result-footer">
+                    <span class="doc-tag">📄 {T['document']} #{doc_id}</span>
+                    <span class="score-value">{T['score']} : {sc:.4f}</span>
+                </div>
+            </div>
+        </div>
+        """)
+    return "".join(cards)
+
+
+@st.cache_data(ttl=ANSWER_CACHE_VERSION_TTL, show_spinner=False)
+def current_corpus_version() -> str | None:
+    # Re-read at most every ANSWER_CACHE_VERSION_TTL seconds, not on every rerun
+    try:
+        return corpus_version()
+    except Exception as e:
+        print(f"[App] ⚠️  Corpus version unavailable: {e}")
+        return None
+
+
+def show_question(q: str, lang: str):
+    """
+    Retrieve, answer and render `q`. The last question's results, rendered
+    cards and answers (one per language) are kept in st.session_state,
+    keyed by normalized question + corpus version: reruns (language toggle,
+    any widget) re-render them without touching the DB or the LLM.
+    """
+    key   = (_normalize_question(q), current_corpus_version())
+    entry = st.session_state.get("last_query")
+    with Metrics.trace("question") as timing:
+        if entry is None or entry["key"] != key:
+            precomputed = precomputed_results().get(key)
+            if precomputed is not None:
+                results, packing = precomputed    # example question, retrieved during warm-up
+            else:
+                if not model_ready():
+                    with st.spinner(T["spinner_model"]):
+                        get_model()
+                with st.spinner(T["spinner_search"]):
+                    results, packing = retrieve(q)
+            entry = {"key": key, "question": q, "results": results, "packing": packing,
+                     "answers": {}, "cards": {}}
+            st.session_state.last_query = entry
+        results = entry["results"]
+        timing.annotate(context=entry["packing"])
+        answer  = entry["answers"].get(lang)
+
+        if not results:
+            st.markdown(f'<div class="empty-state">{T["no_result"]}</div>', unsafe_allow_html=True)
+        else:
+            # ── AI Answer (slot filled once the sources are on screen) ──
+            st.markdown(f'<div class="section-title">{T["ai_section"]}</div>', unsafe_allow_html=True)
+            answer_slot = st.empty()
+            render_answer(answer_slot, answer if answer is not None else T["spinner_answer"])
+
+            # ── Source Fragments ──
+            st.markdown(f'<div class="section-title">{T["src_section"]}</div>', unsafe_allow_html=True)
+            if lang not in entry["cards"]:
+                entry["cards"][lang] = result_cards_html(results, T)
+            st.markdown(entry["cards"][lang], unsafe_allow_html=True)
+
+            if answer is None:
+                # A new generation cancels the answer still streaming for this session
+                previous = st.session_state.get("generation_cancel")
+                if previous is not None:
+                    previous.set()
+                cancel = threading.Event()
+                st.session_state.generation_cancel = cancel
+
+                def keep(text: str):
+                    entry["answers"][lang] = text
+
+                # ── Stream the answer into its slot ──
+                answer, last_render = "", 0.0
+                for delta in generate_answer(q, results, lang, cancel, on_complete=keep,
+                                             packing=entry["packing"]):
+                    answer += delta
+                    if time.monotonic() - last_render > 0.05:
+                        render_answer(answer_slot, answer, streaming=True)
+                        last_render = time.monotonic()
+                render_answer(answer_slot, answer)
+
+    if DEBUG_PANEL or st.query_params.get("debug") == "1":
+        render_timings(timing)
+
+
 st.markdown(f'<div class="search-label">{T["search_label"]}</div>', unsafe_allow_html=True)
 
 question = st.text_area(
@@ -347,58 +611,10 @@ if search_clicked:
     if not q:
         st.warning(T["warn_empty"])
     else:
-        with st.spinner(T["spinner_search"]):
-            results = semantic_search(q, top_k=3)
-
-        if not results:
-            st.markdown(f'<div class="empty-state">{T["no_result"]}</div>', unsafe_allow_html=True)
-        else:
-            with st.spinner(T["spinner_answer"]):
-                answer = generate_answer(q, results, st.session_state.lang)
-
-            # ── AI Answer ──
-            st.markdown(f'<div class="section-title">{T["ai_section"]}</div>', unsafe_allow_html=True)
-            st.markdown(f"""
-            <div class="ai-answer-box">
-                <div class="ai-answer-header">{T['ai_header']}</div>
-                <div class="ai-answer-text">{answer.replace(chr(10), '<br>')}</div>
-            </div>
-            """, unsafe_allow_html=True)
-
-            # ── Source Fragments ──
-            st.markdown(f'<div class="section-title">{T["src_section"]}</div>', unsafe_allow_html=True)
-
-            for i, result in enumerate(results, start=1):
-                sc     = result["score"]
-                cls    = score_class(sc)
-                label  = score_label(sc, T)
-                raw    = re.sub(r'\n{2,}', '\n', result["texte_fragment"]).strip()
-                text   = raw.replace("\n", "<br>")
-                doc_id = result["id_document"]
-                pct    = score_pct(sc)
-
-                st.markdown(f"""
-                <div class="result-card">
-                    <div class="result-card-bar bar-{cls}"></div>
-                    <div class="result-card-body">
-                        <div class="result-header">
-                            <div class="result-rank">
-                                <div class="rank-number">{i}</div>
-                                <span class="rank-label">{T['fragment']} {i}</span>
-                            </div>
-                            <span class="score-pill {cls}">{label}</span>
-                        </div>
-                        <div class="score-bar-wrap">
-                            <div class="score-bar-fill fill-{cls}" style="width:{pct}%"></div>
-                        </div>
-                        <div class="result-text">{text}</div>
-                        <div class="result-footer">
-                            <span class="doc-tag">📄 {T['document']} #{doc_id}</span>
-                            <span class="score-value">{T['score']} : {sc:.4f}</span>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+        show_question(q, st.session_state.lang)
+elif st.session_state.get("last_query") is not None:
+    # Rerun without a new search (language toggle, other widget): same question
+    show_question(st.session_state.last_query["question"], st.session_state.lang)
 
 
 st.markdown(f"""
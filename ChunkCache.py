@@ -0,0 +1,133 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+import numpy as np
+
+from Config import INGEST_EMBED_CACHE_PATH, INGEST_EMBED_CACHE_MAX_ENTRIES
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class ChunkEmbeddingCache:
+    """
+    On-disk store of chunk embeddings for ingestion, in SQLite.
+
+    Keyed on (model key, sha256 of the chunk text): a chunk already encoded
+    by the same model — in an earlier run, another document, or earlier in
+    this batch — is never encoded again. Rebuilds (--force, a new
+    PIPELINE_VERSION) then only pay for the text that actually changed.
+    """
+
+    def __init__(self, path: str = INGEST_EMBED_CACHE_PATH,
+                 max_entries: int | None = INGEST_EMBED_CACHE_MAX_ENTRIES):
+        self.path        = path
+        self.max_entries = max_entries
+        self.hits = self.misses = self.duplicates = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                model     TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                dim       INTEGER NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID""")
+        self._db.commit()
+
+    def get_many(self, model: str, hashes: list[bytes]) -> dict:
+        """hash → float32 vector for the hashes already stored for `model`."""
+        found = {}
+        for start in range(0, len(hashes), 500):    # SQLite host-parameter limit
+            part = hashes[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT text_hash, dim, vector FROM chunk_embeddings "
+                f"WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                (model, *part)).fetchall()
+            for key, dim, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape[0] == dim:
+                    found[bytes(key)] = vector
+        if found:
+            now = time.time()
+            self._db.executemany("UPDATE chunk_embeddings SET last_used = ? "
+                                 "WHERE model = ? AND text_hash = ?",
+                                 [(now, model, key) for key in found])
+            self._db.commit()
+        return found
+
+    def put_many(self, model: str, items):
+        """Store (hash, vector) pairs for `model`."""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO chunk_embeddings (model, text_hash, dim, vector, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(model, key, vector.shape[0], np.asarray(vector, dtype=np.float32).tobytes(), now)
+             for key, vector in items])
+        self._db.commit()
+
+    def prune(self) -> int:
+        """Drop the least recently used entries beyond max_entries (end of a run)."""
+        if not self.max_entries:
+            return 0
+        deleted = self._db.execute("""
+            DELETE FROM chunk_embeddings WHERE (model, text_hash) IN (
+                SELECT model, text_hash FROM chunk_embeddings
+                ORDER BY last_used DESC LIMIT -1 OFFSET ?)
+        """, (self.max_entries,)).rowcount
+        self._db.commit()
+        return deleted
+
+    def stats(self) -> dict:
+        """Hits / encodes of this process; dedup_ratio = share of chunks not encoded."""
+        total = self.hits + self.misses + self.duplicates
+        size  = self._db.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        return {
+            "chunks":      total,
+            "cache_hits":  self.hits,
+            "duplicates":  self.duplicates,       # repeated within the same encode round
+            "encoded":     self.misses,
+            "dedup_ratio": round(1 - self.misses / total, 4) if total else 0.0,
+            "size":        size,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+def embed_with_cache(cache: ChunkEmbeddingCache | None, model_name: str, texts: list[str],
+                     encode) -> np.ndarray:
+    """
+    Embeddings of `texts` in order: stored ones come from `cache`, the
+    distinct missing texts are encoded with encode(list[str]) → (n, dim)
+    array and stored. Without a cache it is encode(texts).
+    """
+    if cache is None or not texts:
+        return encode(texts)
+    hashes  = [text_hash(t) for t in texts]
+    unique  = list(dict.fromkeys(hashes))
+    stored  = cache.get_many(model_name, unique)
+    todo    = [h for h in unique if h not in stored]
+    vectors = dict(stored)
+    if todo:
+        first   = {}
+        for i, h in enumerate(hashes):
+            first.setdefault(h, i)
+        encoded = np.asarray(encode([texts[first[h]] for h in todo]), dtype=np.float32)
+        fresh   = dict(zip(todo, encoded))
+        cache.put_many(model_name, fresh.items())
+        vectors.update(fresh)
+    hits = sum(1 for h in hashes if h in stored)
+    cache.hits       += hits
+    cache.misses     += len(todo)
+    cache.duplicates += len(hashes) - hits - len(todo)
+    return np.vstack([vectors[h] for h in hashes])
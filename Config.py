@@ -12,4 +12,135 @@ DB_CONFIG = {
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 EMBEDDING_DIM   = 384
 
-TOP_K = 3
\ No newline at end of file
+TOP_K = 3
+
+# ── Embedding backend (Embeddings.py) ───────────────────────────────────────
+# "torch" → sentence-transformers / PyTorch fp32
+# "onnx"  → ONNX Runtime on an export of the same model (python Embeddings.py --export),
+#           no torch needed at query / ingest time
+EMBEDDING_BACKEND     = "torch"
+ONNX_MODEL_DIR        = ".onnx"
+ONNX_QUANTIZED        = True     # int8 dynamic-quantized weights (else the fp32 export)
+ONNX_THREADS          = 0        # intra-op threads, 0 → ONNX Runtime default (all cores)
+ONNX_PARITY_THRESHOLD = 0.98     # min cosine(torch, onnx) accepted by the export check
+
+# Shared embedding server (python EmbeddingServer.py): one model per host for
+# every Streamlit process and ingestion run, concurrent requests encoded in
+# micro-batches. The server uses the backend settings above.
+EMBED_SERVER_URL         = None    # e.g. "http://127.0.0.1:8765" or "unix:///tmp/rag-embed.sock"
+EMBED_SERVER_MAX_BATCH   = 64      # texts per micro-batch
+EMBED_SERVER_MAX_WAIT_MS = 5       # how long a batch waits for more requests
+EMBED_SERVER_TIMEOUT     = 30      # seconds per client request
+EMBED_SERVER_FALLBACK    = True    # server unreachable → load the model in-process
+EMBED_SERVER_RETRY_S     = 30      # after a fallback, seconds before trying the server again
+EMBED_SERVER_RETRIES     = 4       # connect attempts retried on ECONNREFUSED / EAGAIN (backoff from 50 ms)
+EMBED_SERVER_BACKLOG     = 128     # listen() backlog: first connections of many workers at once
+
+# ── Vector index (pgvector ANN) ──────────────────────────────────────────────
+# "hnsw" (best recall/latency, slower build), "ivfflat" (fast build) or None
+VECTOR_INDEX_TYPE = "hnsw"
+VECTOR_INDEX_NAME = "embeddings_vecteur_idx"
+
+HNSW_M               = 16     # graph degree (build-time)
+HNSW_EF_CONSTRUCTION = 64     # candidate list size while building
+HNSW_EF_SEARCH       = 40     # candidate list size per query (recall ↔ latency)
+# Filtered searches (semantic_search(filters=...)) are post-filtered inside the
+# index scan: a selective filter can leave fewer than top_k rows out of the
+# ef_search candidates. pgvector >= 0.8 can keep scanning until enough rows
+# pass: "relaxed_order" / "strict_order". None = leave the server default.
+HNSW_ITERATIVE_SCAN  = None
+
+IVFFLAT_LISTS  = None         # None → rows/1000 (min 10), sqrt(rows) above 1M rows
+IVFFLAT_PROBES = 10           # lists scanned per query (recall ↔ latency)
+
+# Compact ANN index (pgvector >= 0.7). The index is built on a compact form of
+# vecteur instead of the float32 vector, and searches re-rank the candidates
+# exactly on the full vectors:
+#   None      → index on vecteur itself (1.5 KB / fragment)
+#   "halfvec" → half precision, 768 B / fragment, recall ≈ exact
+#   "bit"     → binary quantization, 48 B / fragment, needs more over-fetch
+# Changing it only needs an index rebuild: python insert_data.py --reindex
+COMPACT_VECTORS   = None
+COMPACT_OVERFETCH = 10        # candidates fetched per requested result (top_k × this, ≤ 1000 with HNSW)
+
+# ── Connection pool (shared by every Streamlit session of one process) ──────
+DB_POOL_MIN        = 1
+DB_POOL_MAX        = 8
+DB_POOL_IDLE_CHECK = 60       # seconds idle before a pooled conn is re-validated
+DB_KEEPALIVES      = {"keepalives": 1, "keepalives_idle": 30,
+                      "keepalives_interval": 10, "keepalives_count": 3}
+
+# Server-side PREPARE of the search statement, once per pooled connection.
+# Off behind a transaction-mode PgBouncer (Neon's "-pooler" hosts): the next
+# transaction may run on another backend, where the statement is unknown.
+DB_PREPARE_STATEMENTS = "-pooler" not in DB_CONFIG["host"]
+
+# ── Query-embedding cache (in front of Search._embed) ───────────────────────
+EMBED_CACHE_SIZE       = 2048       # max cached questions (LRU eviction)
+EMBED_CACHE_TTL        = 24 * 3600  # seconds; None = never expire
+EMBED_CACHE_PATH       = None       # e.g. ".cache/query_embeddings.pkl" to survive restarts
+EMBED_CACHE_SAVE_EVERY = 50         # persist after this many new entries
+
+# ── Ingestion (insert_data.py) ──────────────────────────────────────────────
+INGEST_BATCH_SIZE       = 64      # chunks per model.encode() call
+INGEST_SORT_BY_LENGTH   = True    # group similar-length chunks → less padding
+INGEST_ENCODE_PROCESSES = 0       # >1 → sentence-transformers multi-process pool
+INGEST_LOAD_METHOD      = "copy_binary"   # "copy_binary" | "copy_text" | "values"
+INGEST_LOAD_BATCH       = 5000    # rows buffered per COPY / execute_values flush
+INGEST_COMMIT_EVERY     = 50000   # rows between commits (None → single commit at the end)
+INGEST_EXTRACT_WORKERS  = 1       # PDF extraction processes (0 → one per CPU)
+INGEST_STREAM_CHUNKS    = 1024    # chunks gathered before each encode + load round
+INGEST_EXTRACT_MODE     = "crop"  # "full" | "crop" | "pypdf" | "auto" (pypdf, pdfplumber fallback)
+# Chunk embeddings already computed (same text, same model_key) are read back
+# from this SQLite file instead of being encoded again. None → always encode.
+INGEST_EMBED_CACHE_PATH        = ".cache/chunk_embeddings.sqlite"
+INGEST_EMBED_CACHE_MAX_ENTRIES = 200_000   # ≈ 1.6 KB each at 384 dims; LRU beyond
+
+# ── Search backend ──────────────────────────────────────────────────────────
+# "pgvector" → query PostgreSQL (Neon) on every search
+# "numpy"    → exact search over a memory-mapped export of the embeddings table
+#              (python insert_data.py --export-numpy), no database round trip
+SEARCH_BACKEND  = "pgvector"
+NUMPY_INDEX_DIR = ".index"
+
+# ── Answer generation (Generation.py) ───────────────────────────────────────
+LLM_MODEL       = "llama-3.3-70b-versatile"
+LLM_MAX_TOKENS  = 2048
+LLM_TIMEOUT     = 30      # seconds per HTTP operation (connect / wait for next token)
+LLM_MAX_SECONDS = 120     # whole answer; the stream is cut past this
+LLM_BASE_URL    = None    # None → Groq API; any OpenAI-compatible URL (e.g. a local fake server)
+
+# ── Readiness (Readiness.py, App startup) ───────────────────────────────────
+# Startup checks read catalog statistics only (no COUNT(*) on embeddings);
+# the warm-up runs in the background after them.
+READY_PREWARM_INDEX       = False   # load the ANN index into shared buffers (needs pg_prewarm)
+READY_PRECOMPUTE_EXAMPLES = True    # run the example questions of the UI during warm-up
+
+# ── Context assembly (Context.py, fragments sent to the LLM) ────────────────
+# The search over-fetches CONTEXT_CANDIDATES fragments; MMR keeps the relevant
+# but mutually different ones, repeated sentences are cut and the result is
+# packed into CONTEXT_TOKEN_BUDGET prompt tokens.
+CONTEXT_CANDIDATES          = 12
+CONTEXT_MAX_FRAGMENTS       = 5
+CONTEXT_TOKEN_BUDGET        = 900
+CONTEXT_MMR_LAMBDA          = 0.7    # 1 → relevance only, 0 → diversity only
+CONTEXT_DUPLICATE_THRESHOLD = 0.95   # cosine to a picked fragment above which a candidate is dropped
+CONTEXT_CHARS_PER_TOKEN     = 3.5    # token estimate for the LLM's tokenizer (FR/EN datasheets)
+
+# ── Answer cache (AnswerCache.py, in front of App.generate_answer) ──────────
+# A stored answer is reused when the language and the retrieved fragments are
+# the same and the question embedding is at least this cosine-similar.
+ANSWER_CACHE_ENABLED     = True
+ANSWER_CACHE_PATH        = ".cache/answers.sqlite"
+ANSWER_CACHE_THRESHOLD   = 0.92
+ANSWER_CACHE_MAX_ENTRIES = 5000
+ANSWER_CACHE_VERSION_TTL = 30     # seconds between corpus-version checks
+
+# ── Metrics (Metrics.py) ────────────────────────────────────────────────────
+# Per-stage timings (embed, connect, query, fetch, llm_ttft, llm_total and the
+# ingestion stages) are always collected in memory; these only choose exports.
+METRICS_LOG           = False   # one JSON line per question / ingestion run on stdout
+METRICS_PORT          = None    # e.g. 9108 → Prometheus text on http://<host>:9108/metrics
+METRICS_FILE          = None    # e.g. "/var/lib/node_exporter/textfile/rag.prom"
+METRICS_FILE_INTERVAL = 15      # seconds between rewrites of METRICS_FILE
+DEBUG_PANEL           = False   # timing breakdown under each answer (or ?debug=1 in the URL)
@@ -0,0 +1,160 @@
+"""
+Context assembly for App.generate_answer: which retrieved fragments go into
+the prompt, and in how many tokens.
+
+    results = semantic_search(q, top_k=CONTEXT_CANDIDATES, return_vectors=True)
+    chunks, report = pack_context(results)
+    prompt = TRANSLATIONS[lang]["prompt"](format_context(chunks), q)
+
+Candidates are picked by MMR on their stored vectors (relevant, but unlike
+the fragments already picked), near-duplicates are dropped, sentences
+already present in an earlier fragment are cut, and the whole is packed
+into CONTEXT_TOKEN_BUDGET tokens.
+"""
+import re
+import math
+
+import numpy as np
+
+from Config import (
+    TOP_K, CONTEXT_MAX_FRAGMENTS, CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA,
+    CONTEXT_DUPLICATE_THRESHOLD, CONTEXT_CHARS_PER_TOKEN,
+)
+
+
+# Sentence or line ends; fragments are "[product] header: text" with one line per item
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+_MIN_SENTENCE   = 20    # shorter pieces (labels, units) are never treated as repeats
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Prompt tokens of `text`, estimated from its length: the LLM's tokenizer
+    is not available locally, CONTEXT_CHARS_PER_TOKEN is calibrated on it.
+    """
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN) if text else 0
+
+
+def format_context(chunks: list[dict]) -> str:
+    """The fragments block of the prompt (the packed text when there is one)."""
+    return "\n\n".join(_entry(i, c.get("context", c["texte_fragment"]))
+                       for i, c in enumerate(chunks))
+
+
+def _entry(i: int, text: str) -> str:
+    return f"Fragment {i+1}:\n{text}"
+
+
+def _sentence_key(sentence: str) -> str:
+    return re.sub(r"\W+", " ", sentence).strip().lower()
+
+
+def _strip_repeats(text: str, seen: set) -> tuple[str, list[str], int]:
+    """(`text` without the sentences in `seen`, its new sentence keys, sentences cut)."""
+    kept, new, cut = [], [], 0
+    for sentence in _SENTENCE_SPLIT.split(text):
+        if not sentence.strip():
+            continue
+        key = _sentence_key(sentence)
+        if len(key) >= _MIN_SENTENCE:
+            if key in seen or key in new:
+                cut += 1
+                continue
+            new.append(key)
+        kept.append(sentence.strip())
+    return ("\n".join(kept) if "\n" in text else " ".join(kept)), new, cut
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """At most `tokens` tokens of `text`, cut at the last sentence end that fits."""
+    limit = int(tokens * CONTEXT_CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    cut  = text[:limit]
+    ends = [m.end() for m in _SENTENCE_SPLIT.finditer(cut)]
+    return (cut[:ends[-1]] if ends and ends[-1] > limit // 2 else cut).rstrip() + " …"
+
+
+def _unit_rows(vectors: list) -> np.ndarray:
+    matrix = np.asarray(np.vstack(vectors), dtype=np.float32)
+    norms  = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def pack_context(candidates: list[dict],
+                 budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_fragments: int = CONTEXT_MAX_FRAGMENTS,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+                 baseline_k: int = TOP_K) -> tuple[list[dict], dict]:
+    """
+    Select and trim `candidates` (semantic_search results, with 'vecteur'
+    from return_vectors=True) for the prompt.
+
+    Picks by maximal marginal relevance:
+        mmr_lambda · score − (1 − mmr_lambda) · max cosine to the picked ones
+    A candidate at least `duplicate_threshold` similar to a picked fragment
+    is dropped, sentences already sent are cut from the others, and picks
+    stop at `max_fragments` or when nothing left fits into `budget` tokens
+    (the first pick is truncated rather than dropped).
+
+    Returns (chunks, report). Chunks are the picked results, best first,
+    without 'vecteur' and with the text to send under 'context'. The report
+    counts candidates, duplicates, trimmed fragments and tokens: 'tokens'
+    is what the fragments block costs, 'baseline_tokens' what the prompt
+    used to cost (the `baseline_k` best candidates pasted in full) and
+    'saved_tokens' the difference, when packing is the cheaper of the two.
+    """
+    baseline_tokens = estimate_tokens(format_context(candidates[:baseline_k]))
+    report = {"candidates": len(candidates), "selected": 0, "duplicates": 0,
+              "trimmed": 0, "over_budget": 0, "tokens": 0,
+              "baseline_tokens": baseline_tokens, "saved_tokens": baseline_tokens}
+    if not candidates:
+        return [], report
+
+    relevance = np.array([c["score"] for c in candidates], dtype=np.float32)
+    if all(c.get("vecteur") is not None for c in candidates):
+        vectors = _unit_rows([c["vecteur"] for c in candidates])
+    else:
+        vectors = None    # no stored vectors: relevance order, exact-text dedup only
+    closest   = np.full(len(candidates), -np.inf, dtype=np.float32)   # max cosine to picked
+    remaining = np.ones(len(candidates), dtype=bool)
+    seen, chunks, used = set(), [], 0
+
+    while remaining.any() and len(chunks) < max_fragments:
+        penalty = np.where(np.isfinite(closest), closest, 0.0)
+        mmr     = mmr_lambda * relevance - (1 - mmr_lambda) * penalty
+        best    = int(np.argmax(np.where(remaining, mmr, -np.inf)))
+        remaining[best] = False
+        candidate = candidates[best]
+
+        if vectors is not None and closest[best] >= duplicate_threshold:
+            report["duplicates"] += 1
+            continue
+        text, new, cut = _strip_repeats(candidate["texte_fragment"], seen)
+        if cut and not new:
+            report["duplicates"] += 1    # every sentence was already sent
+            continue
+
+        cost = estimate_tokens(_entry(len(chunks), text)) + (1 if chunks else 0)
+        if used + cost > budget:
+            if chunks:
+                report["over_budget"] += 1
+                continue
+            text = _truncate(text, budget - estimate_tokens(_entry(0, "")))
+            cost = estimate_tokens(_entry(0, text))
+            cut += 1
+
+        report["trimmed"] += 1 if cut else 0
+        seen.update(new)
+        if vectors is not None:
+            closest = np.maximum(closest, vectors @ vectors[best])
+        chunk = {k: v for k, v in candidate.items() if k != "vecteur"}
+        chunk["context"] = text
+        chunks.append(chunk)
+        used += cost
+
+    report["selected"]     = len(chunks)
+    report["tokens"]       = estimate_tokens(format_context(chunks))
+    report["saved_tokens"] = max(0, baseline_tokens - report["tokens"])
+    return chunks, report
@@ -0,0 +1,224 @@
+"""
+Shared embedding service: one model per host, concurrent requests encoded
+together in micro-batches.
+
+    python EmbeddingServer.py                       # serves EMBED_SERVER_URL
+    python EmbeddingServer.py --url unix:///tmp/rag-embed.sock
+
+With EMBED_SERVER_URL set, Search.py and insert_data.py get an
+Embeddings.EmbeddingClient from load_embedding_model() instead of loading
+torch / ONNX Runtime in every process.
+
+Protocol (HTTP/1.1, keep-alive):
+    POST /encode   {"texts": [...]}  → raw float32 (len(texts), dim), X-Dim header
+    GET  /health   model key, dim and batching figures (JSON)
+    GET  /metrics  Prometheus text (Metrics.render_prometheus)
+"""
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+
+from Config import (
+    EMBED_SERVER_URL, EMBED_SERVER_MAX_BATCH, EMBED_SERVER_MAX_WAIT_MS, EMBED_SERVER_BACKLOG,
+)
+import Metrics
+from Embeddings import load_embedding_model, model_key
+
+
+class MicroBatcher:
+    """
+    Single encoding thread fed by a queue. The first waiting request opens
+    a batch; requests arriving within `max_wait_ms` join it until
+    `max_batch` texts are gathered, then the whole batch is one encode()
+    call and each request gets its rows back. A request larger than
+    max_batch is encoded alone (encode() splits it into batches itself).
+    """
+
+    def __init__(self, model, max_batch: int = EMBED_SERVER_MAX_BATCH,
+                 max_wait_ms: float = EMBED_SERVER_MAX_WAIT_MS):
+        self.model     = model
+        self.max_batch = max_batch
+        self.max_wait  = max_wait_ms / 1000
+        self.dim       = model.get_sentence_embedding_dimension()
+        self.requests  = self.batches = self.texts = 0
+        self._queue    = queue.Queue()
+        self._carry    = None    # request that did not fit in the previous batch
+        self._thread   = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return self.submit(texts).result()
+
+    def _gather(self) -> list:
+        batch, self._carry = [self._carry or self._queue.get()], None
+        size  = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch:
+                self._carry = item       # opens the next batch
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._gather()
+            texts = [t for item, _ in batch for t in item]
+            t0 = time.perf_counter()
+            try:
+                vectors = np.asarray(self.model.encode(texts, batch_size=self.max_batch,
+                                                       convert_to_numpy=True, show_progress_bar=False),
+                                     dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            Metrics.observe("embed_batch", time.perf_counter() - t0)
+            self.requests += len(batch)
+            self.batches  += 1
+            self.texts    += len(texts)
+            start = 0
+            for item, future in batch:
+                future.set_result(vectors[start:start + len(item)])
+                start += len(item)
+
+    def stats(self) -> dict:
+        return {
+            "requests":       self.requests,
+            "batches":        self.batches,
+            "texts":          self.texts,
+            "mean_batch":     round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued":         self._queue.qsize(),
+        }
+
+
+class _EmbedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive: clients reuse one connection per thread
+    batcher: MicroBatcher = None
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, payload: dict):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/health":
+            self._json(200, {"model": model_key(), "dim": self.batcher.dim, **self.batcher.stats()})
+        elif path == "/metrics":
+            self._send(200, Metrics.render_prometheus().encode("utf-8"),
+                       "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/encode":
+            self._json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            body  = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            texts = json.loads(body)["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("'texts' must be a list of strings")
+        except (ValueError, KeyError, TypeError) as e:
+            self._json(400, {"error": str(e)})
+            return
+        try:
+            vectors = self.batcher.encode(texts)
+        except Exception as e:
+            self._json(500, {"error": str(e)})
+            return
+        self._send(200, np.ascontiguousarray(vectors, dtype=np.float32).tobytes(),
+                   "application/octet-stream",
+                   {"X-Dim": self.batcher.dim, "X-Model": model_key()})
+
+    def log_message(self, *args):   # no access log line per request
+        pass
+
+
+class _TcpEmbedHandler(_EmbedHandler):
+    # Headers and body are separate writes: without TCP_NODELAY each small
+    # response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+
+# The default listen() backlog (5) is overrun when many workers open their
+# first connection at once: refused (TCP) or EAGAIN (Unix socket)
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads     = True
+    request_queue_size = EMBED_SERVER_BACKLOG
+
+
+class _TcpHTTPServer(ThreadingHTTPServer):
+    daemon_threads     = True
+    request_queue_size = EMBED_SERVER_BACKLOG
+
+
+def serve(url: str = EMBED_SERVER_URL, max_batch: int = EMBED_SERVER_MAX_BATCH,
+          max_wait_ms: float = EMBED_SERVER_MAX_WAIT_MS):
+    """Load the model once and serve /encode on `url` (http://host:port or unix:///path)."""
+    if not url:
+        raise ValueError("No EMBED_SERVER_URL configured (or pass --url)")
+    print(f"[Embed] Loading model '{model_key()}'...")
+    model = load_embedding_model(server_url=None)    # the real model, never a client of itself
+    model.encode("warm-up", convert_to_numpy=True)
+    _EmbedHandler.batcher = MicroBatcher(model, max_batch, max_wait_ms)
+
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if os.path.exists(parsed.path):
+            os.unlink(parsed.path)    # stale socket of a previous run
+        server = _UnixHTTPServer(parsed.path, _EmbedHandler)
+    else:
+        server = _TcpHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8765),
+                                _TcpEmbedHandler)
+    print(f"[Embed] ✅ Serving {model_key()} on {url} "
+          f"(micro-batches ≤ {max_batch} texts, ≤ {max_wait_ms} ms wait)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if parsed.scheme == "unix" and os.path.exists(parsed.path):
+            os.unlink(parsed.path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=EMBED_SERVER_URL,
+                        help="http://127.0.0.1:8765 or unix:///path/to.sock (default: EMBED_SERVER_URL)")
+    parser.add_argument("--max-batch", type=int, default=EMBED_SERVER_MAX_BATCH,
+                        help="texts per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=EMBED_SERVER_MAX_WAIT_MS,
+                        help="how long a batch waits for more requests")
+    args = parser.parse_args()
+    serve(args.url or "http://127.0.0.1:8765", args.max_batch, args.max_wait_ms)
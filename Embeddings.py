@@ -0,0 +1,447 @@
+"""
+Embedding backends behind the SentenceTransformer.encode interface.
+
+    python Embeddings.py --export          # all-MiniLM-L6-v2 → ONNX fp32 + int8, with parity check
+
+"torch" runs sentence-transformers as before. "onnx" runs an exported copy
+of the same model with ONNX Runtime (optionally int8 dynamic-quantized);
+at query/ingest time it only needs onnxruntime + tokenizers, not torch.
+With EMBED_SERVER_URL set, every process gets an EmbeddingClient of the
+shared server (EmbeddingServer.py) instead of a model of its own.
+"""
+import os
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlparse
+
+import numpy as np
+
+from Config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND,
+    ONNX_MODEL_DIR, ONNX_QUANTIZED, ONNX_THREADS, ONNX_PARITY_THRESHOLD,
+    EMBED_SERVER_URL, EMBED_SERVER_TIMEOUT, EMBED_SERVER_FALLBACK,
+    EMBED_SERVER_RETRY_S, EMBED_SERVER_RETRIES,
+)
+
+
+ONNX_FP32 = "model.onnx"
+ONNX_INT8 = "model.int8.onnx"
+ONNX_META = "embeddings.json"
+
+# Short domain texts used by the parity check (questions + datasheet lines)
+PARITY_SENTENCES = [
+    "Quelles sont les quantités recommandées d'alpha-amylase et de xylanase ?",
+    "Quel est le dosage de l'acide ascorbique pour la surgélation ?",
+    "Comment la transglutaminase améliore-t-elle la texture du pain ?",
+    "Quels sont les allergènes présents dans les enzymes BVZyme ?",
+    "Dosage recommandé pour la glucose oxidase en panification ?",
+    "ما هي الجرعات الموصى بها للألفا أميلاز والزيلاناز؟",
+    "[BVZyme TG881] Dosage: 5 - 30 ppm depending on flour quality and process.",
+    "[BVZyme AF330] Function: fungal alpha-amylase improving volume and crumb softness.",
+    "[BVZyme HCF400] Storage: store in a cool and dry place, below 25 °C, 24 months.",
+    "[BVZyme GOX110] Allergens: free from the 14 major allergens listed in EU 1169/2011.",
+    "Xylanase improves dough stability, oven spring and bread volume.",
+    "Ascorbic acid strengthens the gluten network during mixing and proofing.",
+]
+
+
+def model_key(backend: str = EMBEDDING_BACKEND, quantized: bool = ONNX_QUANTIZED) -> str:
+    """
+    Identifier of the vectors a backend produces. int8 vectors are close to,
+    but not equal to, the fp32 ones: caches and ingestion bookkeeping are
+    keyed on this rather than on EMBEDDING_MODEL alone.
+    """
+    if backend == "torch":
+        return EMBEDDING_MODEL
+    return f"{EMBEDDING_MODEL}@onnx-{'int8' if quantized else 'fp32'}"
+
+
+def onnx_dir(model_name: str = EMBEDDING_MODEL) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+class OnnxEncoder:
+    """
+    ONNX Runtime twin of a sentence-transformers mean-pooling model.
+
+    encode() accepts the arguments the rest of the code passes to
+    SentenceTransformer.encode (str or list, batch_size, convert_to_numpy,
+    show_progress_bar, normalize_embeddings) and returns float32 arrays.
+    """
+
+    def __init__(self, path: str, quantized: bool = ONNX_QUANTIZED, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, ONNX_META)) as f:
+            self.meta = json.load(f)
+        self.path      = path
+        self.quantized = quantized
+        self.normalize = self.meta["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.meta["pad_id"], pad_token=self.meta["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.join(path, ONNX_INT8 if quantized else ONNX_FP32),
+                                            options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def _forward(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        features  = {
+            "input_ids":      np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: features[name] for name in self.input_names})[0]
+        # Mean pooling over real tokens, as sentence_transformers.models.Pooling
+        mask    = features["attention_mask"][..., None].astype(np.float32)
+        pooled  = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts  = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.meta["dim"]), dtype=np.float32)
+        # Length-sorted batches pad less; results go back to input order
+        order   = np.argsort([-len(t) for t in texts], kind="stable")
+        vectors = np.empty((len(texts), self.meta["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            vectors[idx] = self._forward([texts[i] for i in idx])
+        if self.normalize or normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EmbeddingClient:
+    """
+    encode() of a model served by EmbeddingServer.py, for processes that
+    should not load their own copy.
+
+    Same arguments and return types as OnnxEncoder.encode. One keep-alive
+    connection per thread. The server must serve the vectors this process
+    expects (same model_key()), checked on first use. If the server is
+    unreachable (refused, no socket, no answer to the connect) and
+    `fallback` is set, the local model is loaded and used for `retry_s`
+    seconds, then the server is tried again (and the local model released
+    once it answers). A request that times out raises socket.timeout: the
+    server is up but overloaded, and loading a model per process would
+    only add to the load.
+    """
+
+    def __init__(self, url: str = EMBED_SERVER_URL, timeout: float = EMBED_SERVER_TIMEOUT,
+                 fallback: bool = EMBED_SERVER_FALLBACK, backend: str = EMBEDDING_BACKEND,
+                 retry_s: float = EMBED_SERVER_RETRY_S):
+        self.url      = url
+        self.timeout  = timeout
+        self.fallback = fallback
+        self.backend  = backend
+        self.retry_s  = retry_s
+        self._parsed  = urlparse(url)
+        self._local   = threading.local()
+        self._dim     = None
+        self._model   = None     # local fallback model
+        self._retry_at = 0.0     # monotonic time the server is tried again after a fallback
+        self._lock    = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._parsed.scheme == "unix":
+                conn = _UnixHTTPConnection(self._parsed.path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(self._parsed.hostname or "127.0.0.1",
+                                                  self._parsed.port or 8765, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _drop(self, conn: http.client.HTTPConnection):
+        conn.close()
+        self._local.conn = None
+
+    def _connect(self, conn: http.client.HTTPConnection):
+        """
+        Open `conn`, retrying with backoff while the server refuses it: still
+        starting (ECONNREFUSED) or its listen backlog full (EAGAIN on a Unix
+        socket) when many workers connect at once.
+        """
+        delay = 0.05
+        for attempt in range(EMBED_SERVER_RETRIES + 1):
+            try:
+                conn.connect()
+                return
+            except (ConnectionRefusedError, BlockingIOError):
+                conn.close()
+                if attempt == EMBED_SERVER_RETRIES:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+            except socket.timeout as e:
+                # No answer to the connect: unreachable, unlike a timeout on a sent request
+                conn.close()
+                raise ConnectionError(f"Embedding server {self.url}: connect timed out") from e
+            except OSError:
+                conn.close()
+                raise
+
+    def _request(self, method: str, path: str, body: bytes | None = None):
+        headers = {"Content-Type": "application/json"} if body else {}
+        for attempt in (1, 2):
+            conn   = self._connection()
+            reused = conn.sock is not None
+            if not reused:
+                self._connect(conn)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                return response, response.read()
+            except socket.timeout:
+                # The server has the request and may still answer it: never sent twice
+                self._drop(conn)
+                raise
+            except ConnectionError:
+                # Keep-alive connection closed by the server meanwhile: reconnect once
+                self._drop(conn)
+                if not reused or attempt == 2:
+                    raise
+            except (http.client.HTTPException, OSError):
+                self._drop(conn)
+                raise
+
+    def _check_server(self) -> int:
+        response, body = self._request("GET", "/health")
+        health = json.loads(body)
+        expected = model_key(self.backend)
+        if health["model"] != expected:
+            raise ValueError(f"Embedding server at {self.url} serves '{health['model']}', "
+                             f"this process expects '{expected}'")
+        self._dim = health["dim"]
+        return self._dim
+
+    def _local_model(self):
+        """The local model, after a failed server request; the server is tried again in retry_s."""
+        with self._lock:
+            if self._model is None:
+                print(f"[Embeddings] ⚠️  Embedding server {self.url} unreachable — "
+                      f"loading '{model_key(self.backend)}' locally for {self.retry_s:g} s")
+                self._model = load_embedding_model(self.backend, server_url=None)
+            self._retry_at = time.monotonic() + self.retry_s
+            self._dim      = None    # checked again: the server may come back with another model
+            return self._model
+
+    def _in_fallback(self):
+        """The local model while the fallback lasts, else None."""
+        model = self._model
+        return model if model is not None and time.monotonic() < self._retry_at else None
+
+    def _server_back(self):
+        with self._lock:
+            if self._model is not None:
+                print(f"[Embeddings] ✅ Embedding server {self.url} reachable again — local model released")
+                self._model = None
+
+    def get_sentence_embedding_dimension(self) -> int:
+        model = self._in_fallback()
+        if model is not None:
+            return model.get_sentence_embedding_dimension()
+        dim = self._dim
+        if dim is None:
+            try:
+                dim = self._check_server()
+            except socket.timeout:
+                raise       # slow, not down: no local fallback
+            except OSError:
+                if not self.fallback:
+                    raise
+                return self._local_model().get_sentence_embedding_dimension()
+        return dim
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs):
+        model = self._in_fallback()
+        if model is not None:
+            return model.encode(sentences, batch_size=batch_size, convert_to_numpy=True,
+                                show_progress_bar=False, normalize_embeddings=normalize_embeddings)
+        single = isinstance(sentences, str)
+        texts  = [sentences] if single else list(sentences)
+        try:
+            dim = self._dim or self._check_server()
+            if not texts:
+                return np.empty((0, dim), dtype=np.float32)
+            response, body = self._request("POST", "/encode", json.dumps({"texts": texts}).encode("utf-8"))
+        except socket.timeout:
+            raise           # slow, not down: no local fallback
+        except OSError:
+            if not self.fallback:
+                raise
+            return self._local_model().encode(sentences, batch_size=batch_size, convert_to_numpy=True,
+                                              show_progress_bar=False,
+                                              normalize_embeddings=normalize_embeddings)
+        if self._model is not None:
+            self._server_back()
+        if response.status != 200:
+            raise RuntimeError(f"Embedding server error {response.status}: {body[:200]!r}")
+        vectors = np.frombuffer(body, dtype=np.float32).reshape(len(texts), dim).copy()
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, server_url: str | None = EMBED_SERVER_URL):
+    """
+    The embedding model for `backend` ("torch" or "onnx"), ready to encode();
+    with `server_url`, a client of the shared embedding server instead.
+    """
+    if server_url:
+        return EmbeddingClient(server_url, backend=backend)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(EMBEDDING_MODEL)
+    if backend == "onnx":
+        path = onnx_dir()
+        if not os.path.exists(os.path.join(path, ONNX_META)):
+            raise FileNotFoundError(f"No ONNX export in '{path}' — run: python Embeddings.py --export")
+        return OnnxEncoder(path)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx')")
+
+
+# ── Export + parity check (needs torch + sentence-transformers) ──────────────
+def parity(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Row-wise cosine similarity between two (N, dim) embedding matrices."""
+    a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    b = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return {"min_cosine": round(float(cos.min()), 5), "mean_cosine": round(float(cos.mean()), 5)}
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, out_dir: str | None = None,
+                quantize: bool = True, threshold: float = ONNX_PARITY_THRESHOLD) -> dict:
+    """
+    Export the transformer of a sentence-transformers model to ONNX, quantize
+    its weights to int8 (dynamic quantization) and check both files against
+    the PyTorch embeddings. Raises ValueError if a parity check fails.
+
+    The export is written to a temporary directory next to `out_dir` and
+    moved into place only once parity passes: a failed or interrupted
+    export leaves the previous one in use.
+    """
+    out_dir = os.path.abspath(out_dir or onnx_dir(model_name))
+    parent  = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    # Same parent directory, so same filesystem: the renames below are atomic
+    work = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}.export-", dir=parent)
+    try:
+        meta = _export(model_name, work, quantize, threshold)
+        if os.path.exists(out_dir):
+            old = tempfile.mkdtemp(prefix=f".{os.path.basename(out_dir)}.old-", dir=parent)
+            os.replace(out_dir, old)      # a directory cannot be renamed over a non-empty one
+            os.replace(work, out_dir)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(work, out_dir)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return meta
+
+
+def _export(model_name: str, out_dir: str, quantize: bool, threshold: float) -> dict:
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    pooling  = next(m for m in st_model if isinstance(m, models.Pooling))
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"Only mean pooling is supported (got {pooling.get_pooling_mode_str()})")
+
+    transformer = st_model[0].auto_model.eval()
+    tokenizer   = st_model.tokenizer
+    dummy       = tokenizer(["BVZyme dosage"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {n: {0: "batch", 1: "sequence"} for n in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(out_dir, ONNX_FP32)
+    with torch.no_grad():
+        torch.onnx.export(_LastHiddenState(transformer), tuple(dummy[n] for n in input_names),
+                          fp32_path, input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=axes, opset_version=14)
+    tokenizer.save_pretrained(out_dir)   # writes tokenizer.json read by OnnxEncoder
+
+    meta = {
+        "model":          model_name,
+        "dim":            st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "normalize":      any(isinstance(m, models.Normalize) for m in st_model),
+        "pad_id":         tokenizer.pad_token_id,
+        "pad_token":      tokenizer.pad_token,
+        "created_at":     time.time(),
+    }
+    with open(os.path.join(out_dir, ONNX_META), "w") as f:
+        json.dump(meta, f, indent=2)
+    if quantize:
+        quantize_dynamic(fp32_path, os.path.join(out_dir, ONNX_INT8), weight_type=QuantType.QInt8)
+
+    reference = st_model.encode(PARITY_SENTENCES, convert_to_numpy=True)
+    checks = {"fp32": parity(reference, OnnxEncoder(out_dir, quantized=False).encode(PARITY_SENTENCES))}
+    if quantize:
+        checks["int8"] = parity(reference, OnnxEncoder(out_dir, quantized=True).encode(PARITY_SENTENCES))
+    meta["parity"] = checks
+    with open(os.path.join(out_dir, ONNX_META), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    failed = {k: v for k, v in checks.items() if v["min_cosine"] < threshold}
+    if failed:
+        raise ValueError(f"ONNX parity below {threshold}: {failed}")
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--export", action="store_true", help="export EMBEDDING_MODEL to ONNX")
+    parser.add_argument("--no-quantize", action="store_true", help="skip the int8 model")
+    parser.add_argument("--out", default=None, help=f"output directory (default: {onnx_dir()})")
+    args = parser.parse_args()
+    if not args.export:
+        parser.print_help()
+    else:
+        meta = export_onnx(out_dir=args.out, quantize=not args.no_quantize)
+        for name, check in meta["parity"].items():
+            print(f"✅ {name}: min cosine {check['min_cosine']}, mean {check['mean_cosine']}")
+        print(f"📦 Exported to {args.out or onnx_dir()} — set EMBEDDING_BACKEND = \"onnx\" in Config.py")
@@ -0,0 +1,90 @@
+import os
+import abc
+import time
+import threading
+from typing import Iterator
+
+from groq import Groq
+
+from Config import LLM_MODEL, LLM_MAX_TOKENS, LLM_TIMEOUT, LLM_MAX_SECONDS, LLM_BASE_URL
+
+
+class GenerationCancelled(Exception):
+    """Raised by a generator when its cancel event is set mid-stream."""
+
+
+class AnswerGenerator(abc.ABC):
+    """
+    Pluggable LLM backend used by App.generate_answer.
+
+    Subclasses implement stream(), yielding text deltas as they arrive.
+    `cancel` is a threading.Event: once set, the stream must stop and
+    release its connection. Any backend that speaks this interface (a fake
+    for tests, another provider) can be installed with set_generator().
+    """
+
+    @abc.abstractmethod
+    def stream(self, prompt: str, cancel: threading.Event | None = None) -> Iterator[str]:
+        ...
+
+
+class GroqGenerator(AnswerGenerator):
+    """
+    Groq chat completions with stream=True.
+
+    One HTTP client is kept for the process, so TLS sessions and the
+    connection pool are reused across questions. `base_url` points the
+    client at any OpenAI-compatible server (e.g. a local fake).
+    """
+
+    def __init__(self, api_key: str | None = None, model: str = LLM_MODEL,
+                 max_tokens: int = LLM_MAX_TOKENS, timeout: float = LLM_TIMEOUT,
+                 max_seconds: float | None = LLM_MAX_SECONDS,
+                 base_url: str | None = LLM_BASE_URL):
+        self.model       = model
+        self.max_tokens  = max_tokens
+        self.max_seconds = max_seconds
+        self.client      = Groq(api_key=api_key or os.getenv("GROQ_API_KEY"),
+                                base_url=base_url, timeout=timeout, max_retries=1)
+
+    def stream(self, prompt: str, cancel: threading.Event | None = None) -> Iterator[str]:
+        deadline = time.monotonic() + self.max_seconds if self.max_seconds else None
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        try:
+            for chunk in response:
+                if cancel is not None and cancel.is_set():
+                    raise GenerationCancelled()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"generation exceeded {self.max_seconds}s")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Also runs when the caller abandons the generator (Streamlit rerun)
+            response.close()
+
+
+_generator      = None
+_generator_lock = threading.Lock()
+
+
+def get_generator() -> AnswerGenerator:
+    """Process-wide generator, created on first use."""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = GroqGenerator()
+                print(f"[Generation] {type(_generator).__name__} ready ({LLM_MODEL}) ✅")
+    return _generator
+
+
+def set_generator(generator: AnswerGenerator | None) -> None:
+    """Install another backend (None → back to the default on next use)."""
+    global _generator
+    with _generator_lock:
+        _generator = generator
@@ -0,0 +1,258 @@
+"""
+Per-stage latency spans and counters, exported as JSON logs and Prometheus text.
+
+    with span("query"):                  # times one stage (histogram rag_stage_seconds)
+        cur.execute(...)
+    with trace("question") as t:         # collects the spans of one request
+        semantic_search(q)
+    t.breakdown()                        # {"embed": 0.004, "connect": 0.0002, ...}
+
+Prometheus text is served on METRICS_PORT (start_metrics_server) and/or
+written to METRICS_FILE for node_exporter's textfile collector; with
+METRICS_LOG every trace is printed as one JSON line.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Config import METRICS_LOG, METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL
+
+
+# Upper bounds (seconds): sub-millisecond cache hits up to a full LLM answer
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_HELP = {
+    "rag_stage_seconds":                     "Time spent per request stage.",
+    "rag_ingest_stage_seconds":              "Time spent per stage by the last ingestion run.",
+    "rag_ingest_stage_calls":                "Calls per stage in the last ingestion run.",
+    "rag_ingest_chunks":                     "Fragments encoded and inserted by the last ingestion run.",
+    "rag_ingest_documents":                  "Documents processed by the last ingestion run, by outcome.",
+    "rag_ingest_last_run_timestamp_seconds": "End of the last ingestion run (Unix time).",
+    "rag_ready":                             "Readiness of this process (1 for the current status).",
+    "rag_corpus_rows_estimate":              "Embeddings rows, from the catalog statistics.",
+    "rag_prompt_tokens_total":               "Prompt tokens of fragments sent to the LLM, and saved vs the top-k pasted in full.",
+    "rag_ingest_embeddings":                 "Chunk embeddings of the last ingestion run, by source.",
+    "rag_ingest_dedup_ratio":                "Share of chunks of the last ingestion run not encoded.",
+    "rag_answer_cache_total":                "Answer cache lookups, by result (hit / miss).",
+    "rag_answer_cache_saved_seconds_total":  "Generation time of the cached answers served instead.",
+}
+
+_lock       = threading.Lock()
+_histograms = {}   # (name, labels) → [bucket counts..., +Inf count, sum]
+_counters   = {}   # (name, labels) → value
+_gauges     = {}   # (name, labels) → value
+_current    = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class Trace:
+    """The spans recorded while one request (question, ingestion run) was handled."""
+
+    def __init__(self, name: str):
+        self.name    = name
+        self.spans   = []              # (stage, seconds, labels)
+        self.started = time.perf_counter()
+        self.total   = None
+        self.fields  = {}              # annotate(): figures other than timings
+
+    def annotate(self, **fields):
+        """Attach figures other than timings (e.g. prompt tokens) to the trace."""
+        self.fields.update(fields)
+
+    def breakdown(self) -> dict:
+        """Seconds per stage, stages in first-seen order (repeated stages are summed)."""
+        out = {}
+        for stage, seconds, _ in self.spans:
+            out[stage] = out.get(stage, 0.0) + seconds
+        return out
+
+    def as_dict(self) -> dict:
+        return {
+            "event":    self.name,
+            "total_ms": round(1000 * (self.total or time.perf_counter() - self.started), 3),
+            "stages":   {k: round(1000 * v, 3) for k, v in self.breakdown().items()},
+            "spans":    [{"stage": s, "ms": round(1000 * sec, 3), **labels}
+                         for s, sec, labels in self.spans],
+            **self.fields,
+        }
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(stage: str, seconds: float, **labels):
+    """Record one timing of `stage` (histogram + the current trace, if any)."""
+    key = _key("rag_stage_seconds", {"stage": stage, **labels})
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series[i] += 1
+        series[len(BUCKETS)] += 1
+        series[-1] += seconds
+    current = _current.get()
+    if current is not None:
+        current.spans.append((stage, seconds, labels))
+    _maybe_write_file()
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add `value` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a gauge (e.g. figures of the last batch run)."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time the block as one `stage` observation, also when it raises."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0, **labels)
+
+
+@contextmanager
+def trace(name: str):
+    """Collect the spans of the block into a Trace (logged on exit with METRICS_LOG)."""
+    current = Trace(name)
+    token   = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        current.total = time.perf_counter() - current.started
+        if METRICS_LOG:
+            log_event(current.as_dict())
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def log_event(event: dict):
+    """One structured log line (JSON) on stdout."""
+    print(json.dumps({"ts": round(time.time(), 3), **event}, ensure_ascii=False), flush=True)
+
+
+# ── Prometheus text exposition ────────────────────────────────────────────────
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{k}="{_escape(str(v))}"' for k, v in labels + extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus() -> str:
+    """Every histogram and counter in the Prometheus text format (version 0.0.4)."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters   = dict(_counters)
+        gauges     = dict(_gauges)
+
+    lines, seen = [], set()
+
+    def header(name: str, kind: str):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), series in sorted(histograms.items()):
+        header(name, "histogram")
+        for bound, count in zip(BUCKETS, series):
+            lines.append(f"{name}_bucket{_labels_text(labels, (('le', repr(bound)),))} {count}")
+        lines.append(f"{name}_bucket{_labels_text(labels, (('le', '+Inf'),))} {series[len(BUCKETS)]}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {series[-1]:.6f}")
+        lines.append(f"{name}_count{_labels_text(labels)} {series[len(BUCKETS)]}")
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file(path: str = METRICS_FILE):
+    """Atomically (re)write `path`, e.g. for node_exporter's textfile collector."""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+_last_write = 0.0
+
+
+def _maybe_write_file():
+    global _last_write
+    if METRICS_FILE and time.monotonic() - _last_write > METRICS_FILE_INTERVAL:
+        _last_write = time.monotonic()
+        try:
+            write_prometheus_file(METRICS_FILE)
+        except OSError as e:
+            print(f"[Metrics] ⚠️  Could not write {METRICS_FILE}: {e}")
+
+
+if METRICS_FILE:
+    atexit.register(lambda: write_prometheus_file(METRICS_FILE))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):   # no access log on stderr for every scrape
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port: int | None = METRICS_PORT):
+    """Serve /metrics on `port` from a daemon thread (once per process; no-op without a port)."""
+    global _server
+    if not port:
+        return _server
+    with _lock:    # two threads starting it at once: only one binds the port
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError as e:
+            # Another process of the same deployment already serves this port
+            print(f"[Metrics] ⚠️  Port {port} unavailable: {e}")
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _server = server
+    print(f"[Metrics] ✅ Prometheus metrics on http://0.0.0.0:{port}/metrics")
+    return server
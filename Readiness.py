@@ -0,0 +1,254 @@
+"""
+Readiness probe and warm-up for the search service.
+
+    report = check()          # fast: catalog lookups only, no table scan
+    report["status"]          # "ready" | "degraded" | "down"
+    warm_up(questions)        # background: model, pool, index pages, example questions
+
+    python Readiness.py [--warm]    # prints the report, exit code 0 ready / 1 degraded / 2 down
+"""
+import sys
+import json
+import time
+import threading
+from contextlib import ExitStack
+
+import numpy as np
+import psycopg2
+
+from Config import (
+    DB_CONFIG, SEARCH_BACKEND, NUMPY_INDEX_DIR, VECTOR_INDEX_TYPE, EMBEDDING_DIM, DB_POOL_MIN,
+    DB_PREPARE_STATEMENTS, READY_PREWARM_INDEX,
+)
+import Metrics
+import VectorStore
+from Search import (
+    _get_connection, _get_pool, _execute_search,
+    estimated_rows, vector_index_name, get_model, semantic_search,
+)
+from Embeddings import model_key
+
+
+STATUSES = ("ready", "degraded", "down")
+
+_warm      = {}                 # warm-up step → {"ok", "detail", "ms"}
+_warm_lock = threading.Lock()
+_warm_done = threading.Event()
+
+
+def _step(checks: dict, name: str, fn):
+    """Run fn() → (ok, detail) and record it under `name`, timed."""
+    t0 = time.perf_counter()
+    try:
+        ok, detail = fn()
+    except Exception as e:
+        ok, detail = False, str(e).splitlines()[0] if str(e) else type(e).__name__
+    checks[name] = {"ok": ok, "detail": detail, "ms": round(1000 * (time.perf_counter() - t0), 1)}
+    return ok
+
+
+def _check_pgvector(checks: dict, facts: dict) -> str:
+    """
+    Extension check on a plain connection: pooled ones register the vector
+    type when they open, which fails without the extension. Then table and
+    index checks, in one pooled connection.
+    """
+    t0   = time.perf_counter()
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        checks["database"] = {"ok": True, "detail": f"server {conn.server_version}",
+                              "ms": round(1000 * (time.perf_counter() - t0), 1)}
+        with conn.cursor() as cur:
+            def extension():
+                cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+                row = cur.fetchone()
+                return (True, f"pgvector {row[0]}") if row else (False, "extension 'vector' missing")
+
+            if not _step(checks, "extension", extension):
+                return "down"
+    finally:
+        conn.close()
+
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            def table():
+                cur.execute("SELECT to_regclass('embeddings') IS NOT NULL;")
+                if not cur.fetchone()[0]:
+                    return False, "table 'embeddings' missing (run insert_data.py)"
+                return True, "embeddings"
+
+            def rows():
+                facts["rows_estimate"] = estimated_rows(cur)
+                if facts["rows_estimate"] is None:
+                    return True, "rows not analyzed yet (non-empty)"
+                return facts["rows_estimate"] > 0, f"~{facts['rows_estimate']} rows (catalog estimate)"
+
+            def index():
+                if not VECTOR_INDEX_TYPE:
+                    return True, "no ANN index configured (exact scan)"
+                cur.execute("""
+                    SELECT i.indisvalid, pg_relation_size(i.indexrelid)
+                    FROM pg_index i WHERE i.indexrelid = to_regclass(%s);
+                """, (vector_index_name(),))
+                row = cur.fetchone()
+                if row is None:
+                    return False, f"index '{vector_index_name()}' missing (insert_data.py --reindex)"
+                if not row[0]:
+                    return False, f"index '{vector_index_name()}' invalid (interrupted build)"
+                return True, f"{vector_index_name()} ({row[1] // 1024} KB)"
+
+            if not _step(checks, "table", table):
+                return "down"
+            # Zero rows or no ANN index: searches still run, but return nothing or scan
+            has_rows  = _step(checks, "rows", rows)
+            has_index = _step(checks, "index", index)
+            return "ready" if has_rows and has_index else "degraded"
+
+
+def _check_numpy(checks: dict, facts: dict) -> str:
+    def store():
+        facts["rows_estimate"] = len(VectorStore.get_store(NUMPY_INDEX_DIR))
+        return True, NUMPY_INDEX_DIR
+
+    def rows():
+        return facts["rows_estimate"] > 0, f"{facts['rows_estimate']} rows"
+
+    def model():
+        exported = VectorStore.get_store(NUMPY_INDEX_DIR).meta.get("model")
+        if exported and exported != model_key():
+            return False, f"export built with '{exported}', queries use '{model_key()}'"
+        return True, model_key()
+
+    if not _step(checks, "store", store):
+        return "down"
+    has_rows   = _step(checks, "rows", rows)
+    same_model = _step(checks, "model", model)
+    return "ready" if has_rows and same_model else "degraded"
+
+
+def check() -> dict:
+    """
+    Startup readiness without scanning the corpus: catalog row estimate,
+    vector extension, table and ANN index (or the NumPy export). Includes
+    the warm-up steps finished so far.
+
+    status: "ready", "degraded" (searches work but slowly or return
+    nothing: no index, empty corpus) or "down" (searches fail).
+    """
+    t0 = time.perf_counter()
+    checks, facts = {}, {"backend": SEARCH_BACKEND}
+    try:
+        status = (_check_numpy if SEARCH_BACKEND == "numpy" else _check_pgvector)(checks, facts)
+    except Exception as e:
+        checks["database"] = {"ok": False, "detail": str(e).splitlines()[0], "ms": 0.0}
+        status = "down"
+
+    with _warm_lock:
+        warm = dict(_warm)
+    report = {
+        "status":   status,
+        **facts,
+        "checks":   checks,
+        "warm":     warm,
+        "warm_done": _warm_done.is_set(),
+        "ms":       round(1000 * (time.perf_counter() - t0), 1),
+    }
+    for name in STATUSES:
+        Metrics.set_gauge("rag_ready", int(name == status), status=name)
+    if facts.get("rows_estimate") is not None:
+        Metrics.set_gauge("rag_corpus_rows_estimate", facts["rows_estimate"])
+    return report
+
+
+def describe(report: dict) -> str:
+    """One console line for a check() report."""
+    icon     = {"ready": "✅", "degraded": "⚠️ ", "down": "❌"}[report["status"]]
+    problems = [f"{name}: {c['detail']}" for name, c in report["checks"].items() if not c["ok"]]
+    details  = problems or [c["detail"] for c in report["checks"].values()]
+    return f"[Ready] {icon} {report['status']} in {report['ms']:.0f} ms — {' · '.join(details)}"
+
+
+# ── Warm-up ──────────────────────────────────────────────────────────────────
+def _record(name: str, fn):
+    step = {}
+    _step(step, name, fn)        # outside the lock: check() must not wait for a model load
+    with _warm_lock:
+        _warm.update(step)
+
+
+def _warm_pool():
+    """Open DB_POOL_MIN connections and PREPARE the search statements on each."""
+    if SEARCH_BACKEND == "numpy":
+        return True, "NumPy backend, no pool"
+    _get_pool()
+    probe = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    probe[0] = 1.0
+    with ExitStack() as borrowed:
+        # Held at the same time, so each one is a distinct connection the pool keeps
+        for _ in range(DB_POOL_MIN):
+            conn = borrowed.enter_context(_get_connection())
+            with conn.cursor() as cur:
+                for with_vectors in (False, True):    # App fetches vectors for pack_context
+                    _execute_search(conn, cur, probe, 1, None, None, with_vectors=with_vectors)
+    prepared = ", search statements prepared" if DB_PREPARE_STATEMENTS else ""
+    return True, f"{DB_POOL_MIN} connection(s) open{prepared}"
+
+
+def _prewarm_index():
+    """Load the ANN index pages into shared buffers (pg_prewarm extension)."""
+    if SEARCH_BACKEND == "numpy" or not VECTOR_INDEX_TYPE:
+        return True, "nothing to prewarm"
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm';")
+            if cur.fetchone() is None:
+                return False, "pg_prewarm extension missing (CREATE EXTENSION pg_prewarm)"
+            cur.execute("SELECT pg_prewarm(%s::regclass);", (vector_index_name(),))
+            blocks = cur.fetchone()[0]
+    return True, f"{blocks} blocks of {vector_index_name()} loaded"
+
+
+def _run_warm_up(questions: list[str], precompute, prewarm_index: bool):
+    _record("model", lambda: (get_model() is not None, f"{model_key()} loaded, dummy encode done"))
+    _record("pool", _warm_pool)
+    if prewarm_index:
+        _record("prewarm", _prewarm_index)
+    if questions:
+        def examples():
+            run = precompute or semantic_search
+            found = sum(1 for q in questions if run(q))
+            return True, f"{found}/{len(questions)} example questions precomputed"
+        _record("examples", examples)
+    _warm_done.set()
+    with _warm_lock:
+        summary = " · ".join(f"{name} {step['ms']:.0f} ms" + ("" if step["ok"] else f" ⚠️ {step['detail']}")
+                             for name, step in _warm.items())
+    print(f"[Ready] 🔥 Warm-up done — {summary}")
+
+
+def warm_up(questions: list[str] = (), precompute=None,
+            prewarm_index: bool = READY_PREWARM_INDEX) -> threading.Thread:
+    """
+    Warm everything the first question would otherwise pay for, in a
+    background thread: the embedding model (load + dummy encode), the pool
+    connections (with the search statement prepared), optionally the ANN
+    index pages, and `questions` — each run through precompute(q) (default:
+    semantic_search), so their embeddings and results are cached.
+    """
+    thread = threading.Thread(target=_run_warm_up, name="readiness-warmup", daemon=True,
+                              args=(list(questions), precompute, prewarm_index))
+    thread.start()
+    return thread
+
+
+def warm_up_ready() -> bool:
+    return _warm_done.is_set()
+
+
+if __name__ == "__main__":
+    if "--warm" in sys.argv[1:]:
+        warm_up().join()
+    report = check()
+    print(describe(report), file=sys.stderr)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit({"ready": 0, "degraded": 1, "down": 2}[report["status"]])
@@ -1,76 +1,595 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
 
+import os
+import re
+import atexit
+import pickle
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
 
+import numpy as np
 import psycopg2
+from pgvector.psycopg2 import register_vector
+from psycopg2 import errors
+from psycopg2.extensions import connection as _PGConnection
 from psycopg2.extras import RealDictCursor
-from sentence_transformers import SentenceTransformer
-from Config import DB_CONFIG, EMBEDDING_MODEL, TOP_K
+from psycopg2.pool import ThreadedConnectionPool
+from Config import (
+    DB_CONFIG, EMBEDDING_DIM, EMBEDDING_BACKEND, EMBED_SERVER_URL, TOP_K,
+    VECTOR_INDEX_TYPE, VECTOR_INDEX_NAME, HNSW_EF_SEARCH, HNSW_ITERATIVE_SCAN, IVFFLAT_PROBES,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_IDLE_CHECK, DB_KEEPALIVES,
+    DB_PREPARE_STATEMENTS,
+    EMBED_CACHE_SIZE, EMBED_CACHE_TTL, EMBED_CACHE_PATH, EMBED_CACHE_SAVE_EVERY,
+    SEARCH_BACKEND, NUMPY_INDEX_DIR,
+    COMPACT_VECTORS, COMPACT_OVERFETCH,
+)
+import Metrics
+import VectorStore
+from Embeddings import load_embedding_model, model_key
 
 
-print(f"[Search] Loading model '{EMBEDDING_MODEL}'...")
-_model = SentenceTransformer(EMBEDDING_MODEL)
-print(f"[Search] Model ready ✅")
+# ── Embedding model (loaded lazily) ─────────────────────────────────────────
+# Importing sentence-transformers pulls in torch, which dominates cold start.
+# Neither is touched at import time: the model is loaded by the first query,
+# or earlier in the background with warm_up_model().
+_model       = None
+_model_lock  = threading.Lock()
+_model_ready = threading.Event()
 
+STARTUP_TIMINGS = {}     # seconds: import_search, import_backend, model_load, first_encode
 
 
+def get_model():
+    """The SentenceTransformer, loaded on first call (thread-safe, blocks until ready)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f"[Search] Loading model '{model_key()}'...")
+                t0 = time.perf_counter()
+                if EMBEDDING_BACKEND == "torch" and not EMBED_SERVER_URL:
+                    import sentence_transformers   # timed apart: this is the torch import
+                t1 = time.perf_counter()
+                model = load_embedding_model()
+                t2 = time.perf_counter()
+                model.encode("warm-up", convert_to_numpy=True)
+                t3 = time.perf_counter()
+                STARTUP_TIMINGS.update(import_backend=t1 - t0, model_load=t2 - t1,
+                                       first_encode=t3 - t2)
+                _model = model
+                _model_ready.set()
+                print(f"[Search] Model ready ✅ ({startup_report()})")
+    return _model
+
+
+def warm_up_model() -> threading.Thread:
+    """Load the model in a background thread; queries arriving meanwhile wait for it."""
+    thread = threading.Thread(target=get_model, name="search-model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def model_ready() -> bool:
+    """True once the embedding model is loaded (readiness flag for the UI)."""
+    return _model_ready.is_set()
+
+
+def startup_report() -> str:
+    """One line with the cold-start costs measured so far."""
+    labels = [("import_search", "import Search"), ("import_backend", "import backend"),
+              ("model_load", "model load"), ("first_encode", "first encode")]
+    return ", ".join(f"{label} {STARTUP_TIMINGS[key]:.2f}s"
+                     for key, label in labels if key in STARTUP_TIMINGS)
+
+
+# ── Connection pool ──────────────────────────────────────────────────────────
+class _PooledConnection(_PGConnection):
+    """
+    psycopg2 connection that remembers its prepared statements and last use.
+
+    The pgvector adapter is registered once per connection: NumPy arrays are
+    passed as query parameters directly and `vector` columns come back as
+    float32 NumPy arrays.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        register_vector(self)
+        self.commit()
+        self.prepared  = set()
+        self.last_used = time.monotonic()
+
+
+_pool       = None
+_pool_lock  = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    """Create the process-wide pool on first use (shared by all Streamlit sessions)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX,
+                    connection_factory=_PooledConnection,
+                    **DB_KEEPALIVES, **DB_CONFIG,
+                )
+                print(f"[Search] Pool ready ({DB_POOL_MIN}–{DB_POOL_MAX} connections) ✅")
+    return _pool
+
+
+def _is_alive(conn) -> bool:
+    """Cheap round trip to detect connections dropped while idle (Neon suspends)."""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+@contextmanager
 def _get_connection():
-    """Open a PostgreSQL connection using credentials from config.py."""
-    return psycopg2.connect(**DB_CONFIG)
+    """
+    Borrow a warm connection from the pool and give it back afterwards.
+
+    Connections idle for more than DB_POOL_IDLE_CHECK seconds are re-validated
+    and replaced if the server dropped them. The transaction is committed on
+    success and rolled back on error, so a returned connection is always clean.
+    """
+    t0   = time.perf_counter()
+    pool = _get_pool()
+    _pool_slots.acquire()
+    conn = None
+    try:
+        conn = pool.getconn()
+        if conn.closed or time.monotonic() - conn.last_used > DB_POOL_IDLE_CHECK:
+            if not _is_alive(conn):
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        Metrics.observe("connect", time.perf_counter() - t0)
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    finally:
+        if conn is not None:
+            conn.last_used = time.monotonic()
+            pool.putconn(conn, close=bool(conn.closed))
+        _pool_slots.release()
+
+
+def close_pool():
+    """Close every pooled connection (for scripts and tests that want a clean exit)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+# ── Query-embedding cache ────────────────────────────────────────────────────
+class _EmbeddingCache:
+    """
+    Thread-safe LRU + TTL cache of question embeddings.
+
+    Keys are (model key, normalized question) so switching EMBEDDING_MODEL
+    or the embedding backend never serves stale vectors. When a path is given the cache is loaded at
+    start-up and saved every `save_every` new entries and at exit.
+    """
 
+    def __init__(self, max_size: int, ttl: float | None,
+                 path: str | None = None, save_every: int = 50):
+        self.max_size   = max_size
+        self.ttl        = ttl
+        self.path       = path
+        self.save_every = save_every
+        self._data      = OrderedDict()    # key -> (vector, created_at)
+        self._lock      = threading.Lock()
+        self._unsaved   = 0
+        self.hits = self.misses = self.evictions = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
 
-def _embed(text: str) -> str:
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None \
+                    and time.time() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, vector):
+        with self._lock:
+            self._data[key] = (vector, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size":      len(self._data),
+                "max_size":  self.max_size,
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "hit_rate":  round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = list(self._data.items())
+            self._unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)   # atomic: concurrent processes never read half a file
+        except OSError as e:
+            print(f"[Search] ⚠️  Could not save embedding cache: {e}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"[Search] ⚠️  Ignoring unreadable embedding cache: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, (vector, created_at) in snapshot[-self.max_size:]:
+                if self.ttl is None or now - created_at <= self.ttl:
+                    self._data[key] = (vector, created_at)
+        print(f"[Search] Embedding cache warm — {len(self._data)} questions loaded.")
+
+
+_embed_cache = _EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL,
+                               EMBED_CACHE_PATH, EMBED_CACHE_SAVE_EVERY)
+
+
+def _normalize_question(text: str) -> str:
     """
-    Convert a text string into a 384-dim vector and format it as a
-    PostgreSQL-compatible string: '[0.123, -0.456, ...]'
+    Canonical form used as cache key: NFC, lower-case, collapsed whitespace.
+    all-MiniLM-L6-v2 is uncased, so lower-casing does not change the vector.
     """
-    vector = _model.encode(text, convert_to_numpy=True).tolist()
-    return "[" + ",".join(map(str, vector)) + "]"
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
 
+def embedding_cache_stats() -> dict:
+    """Hit/miss statistics of the query-embedding cache."""
+    return _embed_cache.stats()
 
 
-def semantic_search(question: str, top_k: int = TOP_K) -> list[dict]:
+def _embed(text: str) -> np.ndarray:
+    """
+    Convert a text string into a 384-dim float32 NumPy vector, passed as-is
+    to psycopg2 through the pgvector adapter.
+
+    Vectors are served from the query-embedding cache when the same
+    (normalized) question was already asked.
+    """
+    t0  = time.perf_counter()
+    key = (model_key(), _normalize_question(text))
+    vector = _embed_cache.get(key)
+    if vector is None:
+        vector = get_model().encode(text, convert_to_numpy=True).astype(np.float32, copy=False)
+        _embed_cache.put(key, vector)
+        Metrics.observe("embed", time.perf_counter() - t0, cache="miss")
+    else:
+        Metrics.observe("embed", time.perf_counter() - t0, cache="hit")
+    return vector
+
+
+
+def _embed_batch(texts: list[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Embed many questions at once: cached ones are reused, the misses are
+    encoded in a single batched forward pass and added to the cache.
+    """
+    t0      = time.perf_counter()
+    keys    = [(model_key(), _normalize_question(t)) for t in texts]
+    vectors = [_embed_cache.get(key) for key in keys]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = get_model().encode([texts[i] for i in missing], batch_size=batch_size,
+                                convert_to_numpy=True, show_progress_bar=False)
+        for i, vector in zip(missing, encoded.astype(np.float32, copy=False)):
+            vectors[i] = vector
+            _embed_cache.put(keys[i], vector)
+    Metrics.observe("embed", time.perf_counter() - t0, cache="batch")
+    if not vectors:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.vstack(vectors)
+
+
+_SEARCH_STMT = "semantic_search_stmt"
+_SEARCH_SQL  = """
+    SELECT
+        id_document,
+        texte_fragment,{cols}
+        vecteur <=> {q} AS distance
+    FROM embeddings{where}
+    ORDER BY vecteur <=> {q}
+    LIMIT {k}
+"""
+
+# ── Compact vectors (COMPACT_VECTORS) ──
+# The ANN index is built on a compact expression of `vecteur` instead of the
+# full float32 vector (insert_data.create_vector_index). Search is then
+# two-phase: over-fetch candidates through the compact index, re-rank them
+# with the exact cosine distance on the full vectors.
+#   form → (expression of {v}, index opclass, distance operator)
+COMPACT_FORMS = {
+    "halfvec": (f"({{v}})::halfvec({EMBEDDING_DIM})", "halfvec_cosine_ops", "<=>"),
+    "bit":     (f"binary_quantize({{v}})::bit({EMBEDDING_DIM})", "bit_hamming_ops", "<~>"),
+}
+
+
+def vector_index_name(compact: str | None = COMPACT_VECTORS) -> str:
+    # One name per indexed form, so switching COMPACT_VECTORS triggers a rebuild
+    return f"{VECTOR_INDEX_NAME}_{compact}" if compact else VECTOR_INDEX_NAME
+
+_COMPACT_SQL = """
+    SELECT
+        id_document,
+        texte_fragment,{cols}
+        vecteur <=> {q} AS distance
+    FROM (
+        SELECT id, id_document, texte_fragment, vecteur
+        FROM embeddings{where}
+        ORDER BY {compact} {op} {compact_q}
+        LIMIT {n}
+    ) candidates
+    ORDER BY distance
+    LIMIT {k}
+"""
+
+
+def _topk_sql(q: str, k: str, n: str, cols: str = "",
+             compact: str | None = COMPACT_VECTORS, where: str = "") -> str:
+    """
+    Top-k query for the query vector `q` (an SQL expression), either a
+    direct ANN search on vecteur or, with a compact form, the two-phase
+    search over `n` compact candidates. `where` (see _filter_sql) restricts
+    the rows the index scan may return.
+    """
+    if compact is None:
+        return _SEARCH_SQL.format(cols=cols, q=q, k=k, where=where)
+    expression, _, op = COMPACT_FORMS[compact]
+    return _COMPACT_SQL.format(cols=cols, q=q, k=k, n=n, op=op, where=where,
+                               compact=expression.format(v="vecteur"),
+                               compact_q=expression.format(v=q))
+
+
+# ── Metadata filters ──
+# Columns filled by insert_data.py for every fragment. A filter value can be
+#   a list  → column = ANY(values)
+#   a str with '%' → column LIKE pattern   (product LIKE 'BVZyme TG%')
+#   anything else  → column = value
+FILTER_COLUMNS = ("id_document", "product", "section", "language", "filename")
+
+_PRODUCT_MENTION = re.compile(r"\bBVZyme\s*([A-Za-z]+)\s*-?\s*(\d+)", re.IGNORECASE)
+
+
+def _filter_sql(filters: dict | None) -> tuple[str, dict]:
+    """
+    WHERE clause + query parameters for `filters`. The clause goes inside the
+    top-k query, so pgvector applies it during the index scan.
+    """
+    if not filters:
+        return "", {}
+    clauses, params = [], {}
+    for i, (column, value) in enumerate(filters.items()):
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter column '{column}' (expected one of {FILTER_COLUMNS})")
+        name = f"f{i}"
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{column} = ANY(%({name})s)")
+            value = list(value)
+        elif isinstance(value, str) and "%" in value:
+            clauses.append(f"{column} LIKE %({name})s")
+        else:
+            clauses.append(f"{column} = %({name})s")
+        params[name] = value
+    return "\n    WHERE " + " AND ".join(clauses), params
+
+
+def infer_filters(question: str) -> dict | None:
+    """
+    Filters implied by the question: a product reference such as
+    "BVZyme TG881" or "bvzyme tg 881" restricts the search to that product.
+    """
+    match = _PRODUCT_MENTION.search(question)
+    if match is None:
+        return None
+    return {"product": f"BVZyme {match.group(1).upper()}%{match.group(2)}%"}
+
+
+# pgvector rejects hnsw.ef_search above 1000, and an HNSW index scan returns
+# at most ef_search rows (more only with hnsw.iterative_scan, pgvector >= 0.8)
+_EF_SEARCH_MAX = 1000
+
+
+def _candidates(top_k: int, compact: str | None = COMPACT_VECTORS,
+                overfetch: int = COMPACT_OVERFETCH) -> int:
+    """
+    Candidates fetched through the compact index for a top_k search:
+    top_k × overfetch, limited to _EF_SEARCH_MAX with an HNSW index (what
+    one scan returns) but never fewer than top_k.
+    """
+    if not compact:
+        return top_k
+    if VECTOR_INDEX_TYPE == "hnsw":
+        return min(top_k * overfetch, max(top_k, _EF_SEARCH_MAX))
+    return top_k * overfetch
+
+
+def _set_search_params(cur, ef_search: int | None, probes: int | None,
+                       candidates: int = 0, filtered: bool = False):
+    """
+    Apply the ANN recall/latency knobs for the current transaction only.
+
+    hnsw.ef_search      → size of the HNSW candidate list, raised to `candidates`
+                          (an index scan returns at most ef_search rows) and
+                          capped at pgvector's maximum, 1000
+    hnsw.iterative_scan → HNSW_ITERATIVE_SCAN, for filtered searches and when
+                          `candidates` exceeds 1000 (a top_k above 1000); left
+                          unset, such a search returns at most 1000 rows
+    ivfflat.probes      → number of IVFFlat lists scanned
+    SET LOCAL keeps the setting scoped to this query's transaction.
+    """
+    if VECTOR_INDEX_TYPE == "hnsw" or ef_search is not None:
+        ef = min(max(int(ef_search or HNSW_EF_SEARCH), candidates), _EF_SEARCH_MAX)
+        cur.execute("SET LOCAL hnsw.ef_search = %s;", (ef,))
+        if HNSW_ITERATIVE_SCAN and (filtered or candidates > ef):
+            cur.execute("SET LOCAL hnsw.iterative_scan = %s;", (HNSW_ITERATIVE_SCAN,))
+    if VECTOR_INDEX_TYPE == "ivfflat" or probes is not None:
+        cur.execute("SET LOCAL ivfflat.probes = %s;", (int(probes or IVFFLAT_PROBES),))
+
+
+def _execute_search(conn, cur, vector: np.ndarray, top_k: int,
+                    ef_search: int | None, probes: int | None,
+                    explain: str = "", with_vectors: bool = False,
+                    filters: dict | None = None) -> list:
+    """
+    Run the top-k query on a pooled connection.
+
+    With DB_PREPARE_STATEMENTS the statement is PREPAREd once per connection
+    and then only EXECUTEd. If the server lost it (reconnect, PgBouncer) the
+    transaction is retried once after re-preparing. Filtered searches are not
+    prepared: the filter set varies from call to call.
+    """
+    stmt = _SEARCH_STMT + (f"_{COMPACT_VECTORS}" if COMPACT_VECTORS else "") \
+        + ("_vec" if with_vectors else "")
+    cols = "\n        vecteur," if with_vectors else ""
+    n    = _candidates(top_k)
+    where, params = _filter_sql(filters)
+    for attempt in (1, 2):
+        try:
+            t0 = time.perf_counter()
+            _set_search_params(cur, ef_search, probes, candidates=n, filtered=bool(where))
+            if where:
+                cur.execute(explain + _topk_sql(q="%(vec)s::vector", k="%(k)s", n="%(n)s",
+                                                cols=cols, where=where),
+                            {"vec": vector, "k": top_k, "n": n, **params})
+            elif DB_PREPARE_STATEMENTS:
+                if stmt not in conn.prepared:
+                    cur.execute(f"PREPARE {stmt}(vector, int, int) AS "
+                                + _topk_sql(q="$1", k="$2", n="$3", cols=cols))
+                    conn.prepared.add(stmt)
+                cur.execute(f"{explain}EXECUTE {stmt}(%s, %s, %s);", (vector, top_k, n))
+            else:
+                cur.execute(explain + _topk_sql(q="%(vec)s::vector", k="%(k)s", n="%(n)s", cols=cols),
+                            {"vec": vector, "k": top_k, "n": n})
+            Metrics.observe("query", time.perf_counter() - t0)
+            with Metrics.span("fetch"):
+                return cur.fetchall()
+        except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement) as e:
+            conn.rollback()
+            if isinstance(e, errors.DuplicatePreparedStatement):
+                conn.prepared.add(stmt)
+            else:
+                conn.prepared.discard(stmt)
+            if attempt == 2:
+                raise
+
+
+def semantic_search(question: str, top_k: int = TOP_K,
+                    ef_search: int | None = None,
+                    probes: int | None = None,
+                    return_vectors: bool = False,
+                    filters: dict | None = None) -> list[dict]:
     """
     Find the most semantically similar fragments to the user's question.
 
     How it works:
       1. Embed the question with all-MiniLM-L6-v2  →  384-dim vector
-      2. Run SQL: compare against all stored vectors using cosine distance (<=>)
+      2. Run SQL: ORDER BY the raw cosine distance (<=>) so pgvector can
+         walk the HNSW / IVFFlat index instead of scanning the whole table
+         (with COMPACT_VECTORS: over-fetch top_k × COMPACT_OVERFETCH
+         candidates through the compact index, re-rank them exactly)
       3. score = 1 - cosine_distance  (so 1.0 = perfect match, 0.0 = unrelated)
       4. Return the top_k results sorted by score descending
 
     Args:
-        question : Natural language question from the user.
-        top_k    : How many results to return (default 3, set in config.py).
+        question  : Natural language question from the user.
+        top_k     : How many results to return (default 3, set in config.py).
+        ef_search : HNSW candidate list size for this call (higher = better
+                    recall, slower). Defaults to HNSW_EF_SEARCH.
+        probes    : IVFFlat lists to scan for this call (higher = better
+                    recall, slower). Defaults to IVFFLAT_PROBES.
+        return_vectors : Also return each fragment's stored vector
+                    (float32 NumPy array) under 'vecteur'.
+        filters   : Restrict the search to matching fragments, e.g.
+                    {'section': 'Dosage'} or {'product': 'BVZyme TG%'}
+                    (see FILTER_COLUMNS). Applied inside the ANN query;
+                    a selective filter may return fewer than top_k rows
+                    unless HNSW_ITERATIVE_SCAN is set.
 
     Returns:
         List of dicts:  { 'texte_fragment', 'score', 'id_document' }
+        (+ 'vecteur' when return_vectors=True)
     """
-    vector_str = _embed(question)
+    vector = _embed(question)
 
-    sql = """
-        SELECT
-            id_document,
-            texte_fragment,
-            1 - (vecteur <=> %s::vector) AS score
-        FROM embeddings
-        ORDER BY score DESC
-        LIMIT %s;
-    """
+    if SEARCH_BACKEND == "numpy":
+        return _numpy_search(vector, top_k, return_vectors, filters)
 
     try:
-        conn = _get_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(sql, (vector_str, top_k))
-            rows = cur.fetchall()
-        conn.close()
-
-        return [
-            {
+        with _get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                rows = _execute_search(conn, cur, vector, top_k, ef_search, probes,
+                                       with_vectors=return_vectors, filters=filters)
+
+        results = []
+        for row in rows:
+            result = {
                 "id_document":    row["id_document"],
                 "texte_fragment": row["texte_fragment"],
-                "score":          round(float(row["score"]), 4),
+                "score":          round(1 - float(row["distance"]), 4),
             }
-            for row in rows
-        ]
+            if return_vectors:
+                result["vecteur"] = VectorStore.as_numpy(row["vecteur"])
+            results.append(result)
+        return results
 
     except psycopg2.OperationalError as e:
         print(f"[Search] ❌ DB connection error: {e}")
@@ -80,23 +599,206 @@ def semantic_search(question: str, top_k: int = TOP_K) -> list[dict]:
         return []
 
 
+def _numpy_search(vector: np.ndarray, top_k: int, return_vectors: bool,
+                  filters: dict | None = None) -> list[dict]:
+    """semantic_search() against the memory-mapped export (SEARCH_BACKEND = "numpy")."""
+    try:
+        store = VectorStore.get_store(NUMPY_INDEX_DIR)
+        with Metrics.span("query", backend="numpy"):
+            rows, scores = store.search(vector, top_k,
+                                        rows=store.filter_rows(filters) if filters else None)
+        results = []
+        for row, score in zip(rows, scores):
+            result = {
+                "id_document":    int(store.doc_ids[row]),
+                "texte_fragment": store.fragment(row),
+                "score":          round(float(score), 4),
+            }
+            if return_vectors:
+                result["vecteur"] = np.array(store.vectors[row])
+            results.append(result)
+        return results
+    except Exception as e:
+        print(f"[Search] ❌ NumPy index error ({NUMPY_INDEX_DIR}): {e}")
+        return []
+
+
+_BATCH_SQL = """
+    SELECT q.ord, r.id_document, r.texte_fragment, r.distance
+    FROM unnest(%(vecs)s::vector[]) WITH ORDINALITY AS q(vec, ord)
+    CROSS JOIN LATERAL ({topk}) r
+    ORDER BY q.ord, r.distance;
+"""
+
+
+def semantic_search_batch(questions: list[str], top_k: int = TOP_K,
+                          ef_search: int | None = None,
+                          probes: int | None = None,
+                          filters: dict | None = None,
+                          vectors: np.ndarray | None = None) -> list[list[dict]]:
+    """
+    semantic_search() for many questions in one go, `filters` applying to
+    every question. `vectors` are the question embeddings when the caller
+    already has them (one row per question), else they are computed here.
+
+    The questions are embedded in one batched forward pass. With pgvector,
+    all query vectors go to the server in a single round trip
+    (unnest + LATERAL), and each one still walks the ANN index. With the
+    NumPy backend the scores come from one matrix-matrix product.
+
+    Returns:
+        One result list per question, in input order (same dicts as semantic_search).
+        Raises on database errors so batch jobs can retry or stop.
+    """
+    if not questions:
+        return []
+    if vectors is None:
+        vectors = _embed_batch(questions)
+    elif len(vectors) != len(questions):
+        raise ValueError(f"{len(vectors)} vectors for {len(questions)} questions")
+
+    if SEARCH_BACKEND == "numpy":
+        store  = VectorStore.get_store(NUMPY_INDEX_DIR)
+        output = []
+        allowed = store.filter_rows(filters) if filters else None
+        for rows, scores in store.search_many(vectors, top_k, rows=allowed):
+            output.append([
+                {
+                    "id_document":    int(store.doc_ids[row]),
+                    "texte_fragment": store.fragment(row),
+                    "score":          round(float(score), 4),
+                }
+                for row, score in zip(rows, scores)
+            ])
+        return output
+
+    output = [[] for _ in questions]
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            n = _candidates(top_k)
+            where, params = _filter_sql(filters)
+            with Metrics.span("query", batch=True):
+                _set_search_params(cur, ef_search, probes, candidates=n, filtered=bool(where))
+                cur.execute(_BATCH_SQL.format(topk=_topk_sql(q="q.vec", k="%(k)s", n="%(n)s",
+                                                             where=where)),
+                            {"vecs": list(vectors), "k": top_k, "n": n, **params})
+            with Metrics.span("fetch", batch=True):
+                rows = cur.fetchall()
+            for ord_, doc_id, text, distance in rows:
+                output[ord_ - 1].append({
+                    "id_document":    doc_id,
+                    "texte_fragment": text,
+                    "score":          round(1 - float(distance), 4),
+                })
+    return output
+
+
+def explain_search(question: str, top_k: int = TOP_K,
+                   ef_search: int | None = None,
+                   probes: int | None = None,
+                   analyze: bool = False,
+                   filters: dict | None = None) -> dict:
+    """
+    Show the query plan Postgres picks for semantic_search().
+
+    Use this to confirm the planner actually walks the vector index
+    (an "Index Scan using embeddings_vecteur_idx") rather than a Seq Scan.
+    With analyze=True the query is really executed and timings are included.
+
+    Returns:
+        { 'plan': str, 'uses_index': bool }
+    """
+    if SEARCH_BACKEND == "numpy":
+        store = VectorStore.get_store(NUMPY_INDEX_DIR)
+        return {"plan": f"NumPy exact scan: {len(store)} × {store.vectors.shape[1]} "
+                        f"memory-mapped from {NUMPY_INDEX_DIR}/ (dot product + argpartition)",
+                "uses_index": False}
+
+    vector  = _embed(question)
+    explain = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            rows = _execute_search(conn, cur, vector, top_k, ef_search, probes,
+                                   explain=explain, filters=filters)
+        plan = "\n".join(row[0] for row in rows)
+
+    return {"plan": plan, "uses_index": vector_index_name() in plan}
+
+
+def corpus_version() -> str:
+    """
+    Fingerprint of the indexed corpus; it changes whenever insert_data.py
+    adds, re-processes or removes a document (or re-exports the NumPy index).
+    Used to invalidate caches built on search results.
+    """
+    if SEARCH_BACKEND == "numpy":
+        meta = VectorStore.get_store(NUMPY_INDEX_DIR).meta
+        return f"numpy:{meta['count']}:{meta['created_at']}"
+    with _get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('documents') IS NOT NULL;")
+            if cur.fetchone()[0]:
+                cur.execute("SELECT COUNT(*), MAX(updated_at) FROM documents;")
+            else:
+                # Database filled before incremental ingestion existed. No COUNT(*)
+                # scan: MAX(id) comes from the primary key, the row count from the
+                # planner statistics (it moves with deletes once they are analyzed)
+                cur.execute("""
+                    SELECT (SELECT reltuples::bigint FROM pg_class WHERE oid = 'embeddings'::regclass),
+                           (SELECT MAX(id) FROM embeddings);
+                """)
+            count, last = cur.fetchone()
+    return f"pgvector:{count}:{last}"
+
+
+def estimated_rows(cur, table: str = "embeddings") -> int | None:
+    """
+    Row count of `table` from the planner statistics (pg_class.reltuples),
+    without scanning it. None if the table was never vacuumed / analyzed,
+    0 only when it is really empty.
+    """
+    cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+    estimate = cur.fetchone()[0]
+    if estimate > 0:
+        return estimate
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table});")
+    return None if cur.fetchone()[0] else 0
+
+
 def test_connection() -> bool:
     """
-    Check that PostgreSQL is reachable and the embeddings table exists.
-    Called by app.py on startup to show a clear error if credentials are wrong.
+    Check that PostgreSQL is reachable and the embeddings table exists
+    (or, with SEARCH_BACKEND = "numpy", that the exported index can be opened).
+    The row count is the catalog estimate: no scan of the table.
+    Readiness.check() is the detailed version (extension, index, warm-up).
 
     Returns:
         True  → DB is reachable, table exists, count shown.
         False → something is wrong (check config.py).
     """
     try:
-        conn = _get_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM embeddings;")
-            count = cur.fetchone()[0]
-        conn.close()
-        print(f"[Search] ✅ Connected — {count} embeddings found.")
+        if SEARCH_BACKEND == "numpy":
+            count = len(VectorStore.get_store(NUMPY_INDEX_DIR))
+            print(f"[Search] ✅ NumPy index loaded — {count} embeddings found.")
+            return True
+        with _get_connection() as conn:
+            with conn.cursor() as cur:
+                count = estimated_rows(cur)
+        shown = f"~{count}" if count is not None else "an unknown number of (not analyzed)"
+        print(f"[Search] ✅ Connected — {shown} embeddings found.")
         return True
     except Exception as e:
         print(f"[Search] ❌ Connection failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+STARTUP_TIMINGS["import_search"] = time.perf_counter() - _IMPORT_STARTED
+
+
+if __name__ == "__main__":
+    # Cold-start report: python Search.py
+    get_model()
+    t0 = time.perf_counter()
+    _embed("Quel est le dosage recommandé de xylanase ?")
+    print(f"[Search] Startup: {startup_report()}, next encode {time.perf_counter() - t0:.3f}s")
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+
+import numpy as np
+
+
+# ── On-disk layout ───────────────────────────────────────────────────────────
+#   vectors.npy    float32 (N, dim), L2-normalised → cosine similarity = dot product
+#   ids.npy        int64   (N,)   embeddings.id
+#   doc_ids.npy    int32   (N,)   embeddings.id_document
+#   offsets.npy    int64   (N+1,) byte offsets of each fragment in fragments.bin
+#   fragments.bin  UTF-8 texte_fragment, concatenated
+#   meta_<col>.npy int32   (N,)   metadata column codes into meta.json["columns"][col], -1 = NULL
+#   meta.json      model, dim, count, created_at, columns
+VECTORS   = "vectors.npy"
+IDS       = "ids.npy"
+DOC_IDS   = "doc_ids.npy"
+OFFSETS   = "offsets.npy"
+FRAGMENTS = "fragments.bin"
+META      = "meta.json"
+
+
+def as_numpy(value) -> np.ndarray:
+    """
+    A vecteur column value as a float32 array: pgvector >= 0.4 returns
+    Vector objects, older versions NumPy arrays.
+    """
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def write_store(out_dir: str, rows, count: int, dim: int, model: str,
+                meta_columns: tuple = ()) -> int:
+    """
+    Write (id, id_document, texte_fragment, vector, *metadata) rows to a
+    NumPy store, metadata values matching `meta_columns`.
+
+    Vectors are streamed into a memory-mapped .npy, so the whole matrix never
+    has to fit in RAM. Metadata columns are stored dictionary-encoded (one
+    int32 code per row). The store is built in a temporary directory and
+    swapped in at the end: processes reading the old store keep their mapping.
+
+    Returns the number of rows written.
+    """
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vectors = np.lib.format.open_memmap(os.path.join(tmp_dir, VECTORS), mode="w+",
+                                        dtype=np.float32, shape=(count, dim))
+    ids     = np.empty(count, dtype=np.int64)
+    doc_ids = np.empty(count, dtype=np.int32)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    codes   = {col: np.full(count, -1, dtype=np.int32) for col in meta_columns}
+    values  = {col: {} for col in meta_columns}    # value → code
+
+    n = 0
+    with open(os.path.join(tmp_dir, FRAGMENTS), "wb") as frag:
+        for row_id, doc_id, text, vector, *meta in rows:
+            if n == count:
+                break
+            vector = np.asarray(vector, dtype=np.float32)
+            norm   = np.linalg.norm(vector)
+            vectors[n] = vector / norm if norm else vector
+            ids[n], doc_ids[n] = row_id, doc_id
+            data = (text or "").encode("utf-8")
+            frag.write(data)
+            offsets[n + 1] = offsets[n] + len(data)
+            for col, value in zip(meta_columns, meta):
+                if value is not None:
+                    codes[col][n] = values[col].setdefault(value, len(values[col]))
+            n += 1
+    vectors.flush()
+    del vectors
+
+    if n < count:
+        # Fewer rows than announced: rewrite the matrix at its real size
+        full = np.load(os.path.join(tmp_dir, VECTORS), mmap_mode="r")
+        kept = np.array(full[:n])
+        del full
+        np.save(os.path.join(tmp_dir, VECTORS), kept)
+    np.save(os.path.join(tmp_dir, IDS), ids[:n])
+    np.save(os.path.join(tmp_dir, DOC_IDS), doc_ids[:n])
+    np.save(os.path.join(tmp_dir, OFFSETS), offsets[:n + 1])
+    for col in meta_columns:
+        np.save(os.path.join(tmp_dir, f"meta_{col}.npy"), codes[col][:n])
+    columns = {col: list(values[col]) for col in meta_columns}
+    with open(os.path.join(tmp_dir, META), "w") as f:
+        json.dump({"model": model, "dim": dim, "count": n, "created_at": time.time(),
+                   "columns": columns}, f)
+
+    old_dir = f"{out_dir}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return n
+
+
+class NumpyVectorStore:
+    """
+    Read-only, memory-mapped view of a store written by write_store().
+
+    Every array is opened with mmap_mode="r", so all Streamlit processes on a
+    host share the same page-cache pages (zero-copy). Top-k is an exact
+    cosine search: one matrix-vector product plus argpartition.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        self.vectors   = np.load(os.path.join(path, VECTORS), mmap_mode="r")
+        self.ids       = np.load(os.path.join(path, IDS), mmap_mode="r")
+        self.doc_ids   = np.load(os.path.join(path, DOC_IDS), mmap_mode="r")
+        self.offsets   = np.load(os.path.join(path, OFFSETS), mmap_mode="r")
+        size = os.path.getsize(os.path.join(path, FRAGMENTS))
+        self.fragments = np.memmap(os.path.join(path, FRAGMENTS), dtype=np.uint8, mode="r") \
+            if size else np.empty(0, dtype=np.uint8)
+        self.columns   = self.meta.get("columns", {})
+        self.codes     = {col: np.load(os.path.join(path, f"meta_{col}.npy"), mmap_mode="r")
+                          for col in self.columns}
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def fragment(self, row: int) -> str:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.fragments[start:end].tobytes().decode("utf-8")
+
+    def filter_rows(self, filters: dict) -> np.ndarray:
+        """
+        Row numbers matching every filter, with the semantics of
+        Search.semantic_search(filters=...): a list → any of its values,
+        a string containing '%' → SQL LIKE pattern, anything else → equality.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in filters.items():
+            if column == "id_document":
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                mask &= np.isin(self.doc_ids, [int(v) for v in values])
+                continue
+            if column not in self.columns:
+                raise ValueError(f"Column '{column}' is not in this export "
+                                 f"(available: id_document, {', '.join(self.columns)})")
+            categories = self.columns[column]
+            if isinstance(value, (list, tuple, set)):
+                wanted = [i for i, c in enumerate(categories) if c in value]
+            elif isinstance(value, str) and "%" in value:
+                pattern = like_to_regex(value)
+                wanted  = [i for i, c in enumerate(categories) if pattern.fullmatch(c)]
+            else:
+                wanted  = [i for i, c in enumerate(categories) if c == value]
+            mask &= np.isin(self.codes[column], wanted)
+        return np.flatnonzero(mask)
+
+    def search(self, query: np.ndarray, top_k: int,
+               rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (rows, scores) of the top_k most similar vectors, best first,
+        among `rows` only when given (see filter_rows).
+        """
+        if len(self) == 0 or top_k <= 0 or (rows is not None and len(rows) == 0):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        norm  = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = (self.vectors if rows is None else self.vectors[rows]) @ query
+        if top_k < len(scores):
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def search_many(self, queries: np.ndarray, top_k: int, block: int = 256,
+                    rows: np.ndarray | None = None):
+        """search() for a (Q, dim) matrix of queries, `block` queries per matrix product."""
+        queries = np.asarray(queries, dtype=np.float32)
+        norms   = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        matrix  = self.vectors if rows is None else self.vectors[rows]
+        k = min(top_k, matrix.shape[0])
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ matrix.T
+            if k <= 0:
+                for _ in range(len(scores)):
+                    yield np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+                continue
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top   = np.take_along_axis(top, order, axis=1)
+            for i in range(len(scores)):
+                yield (top[i] if rows is None else rows[top[i]]), scores[i, top[i]]
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """SQL LIKE pattern ('%' any run, '_' one character) as a compiled regex."""
+    return re.compile("".join(".*" if ch == "%" else "." if ch == "_" else re.escape(ch)
+                              for ch in pattern), re.DOTALL)
+
+
+_stores      = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str) -> NumpyVectorStore:
+    """
+    Process-wide store for `path`, reopened when the export is replaced
+    (meta.json has a new mtime).
+    """
+    with _stores_lock:
+        cached = _stores.get(path)
+        try:
+            mtime = os.path.getmtime(os.path.join(path, META))
+        except FileNotFoundError:
+            if cached is None:
+                raise
+            return cached[1]   # export being swapped in right now: keep the old mapping
+        if cached is None or cached[0] != mtime:
+            _stores[path] = (mtime, NumpyVectorStore(path))
+        return _stores[path][1]
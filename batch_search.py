@@ -0,0 +1,102 @@
+"""
+Offline batch retrieval: run semantic search over a whole question set.
+
+    python batch_search.py questions.jsonl -o results.jsonl
+    python batch_search.py questions.csv --field question --top-k 5
+
+Input is JSONL (one object per line) or CSV with a header; each record keeps
+its fields in the output, with a "results" list added. Output is written
+batch by batch, so partial results survive an interruption.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+
+from Config import TOP_K
+from Search import _embed_batch, semantic_search_batch
+
+
+def read_questions(path: str, field: str):
+    """Yield input records (dicts) that have a non-empty `field`."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for n, record in enumerate(records, 1):
+            if isinstance(record, str):
+                record = {field: record}
+            if not str(record.get(field) or "").strip():
+                print(f"⚠️  Record {n}: no '{field}' field — skipped.", file=sys.stderr)
+                continue
+            yield record
+
+
+def _batches(records, size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main(input_path: str, output_path: str | None, field: str = "question",
+         top_k: int = TOP_K, batch_size: int = 64, ef_search: int | None = None,
+         probes: int | None = None):
+    records = list(read_questions(input_path, field))
+    total   = len(records)
+    if not total:
+        print("⚠️  No questions to run.", file=sys.stderr)
+        return
+    print(f"❓ {total} questions, batches of {batch_size}, top_k={top_k}", file=sys.stderr)
+
+    out = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    done, embed_time, search_time = 0, 0.0, 0.0
+    t0 = time.perf_counter()
+    try:
+        for batch in _batches(records, batch_size):
+            questions = [str(r[field]) for r in batch]
+
+            # Embed first so the model time is reported apart from the DB time
+            t = time.perf_counter()
+            vectors = _embed_batch(questions, batch_size)
+            embed_time += time.perf_counter() - t
+
+            t = time.perf_counter()
+            results = semantic_search_batch(questions, top_k, ef_search, probes, vectors=vectors)
+            search_time += time.perf_counter() - t
+
+            for record, hits in zip(batch, results):
+                out.write(json.dumps({**record, "results": hits}, ensure_ascii=False) + "\n")
+            out.flush()
+            done += len(batch)
+            elapsed = time.perf_counter() - t0
+            print(f"   [{done}/{total}] {done / elapsed:.1f} q/s", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"\n✅ {done} questions in {elapsed:.2f}s ({done / elapsed:.1f} q/s) — "
+          f"embedding {embed_time:.2f}s, search {search_time:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="questions file (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", help="results file (JSONL, default: stdout)")
+    parser.add_argument("--field", default="question", help="question field name")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="questions embedded and sent to the database at once")
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--probes", type=int, default=None)
+    args = parser.parse_args()
+    main(args.input, args.output, args.field, args.top_k, args.batch_size,
+         args.ef_search, args.probes)
@@ -0,0 +1,115 @@
+"""
+Recall@k of the compact (halfvec / bit) two-phase search vs exact search.
+
+    python bench_compact.py                         # 200 stored fragments as queries
+    python bench_compact.py --questions q.txt -k 5 --overfetch 4 10 20
+
+Ground truth is an exact sequential scan on the full vectors. Each form runs
+the same SQL as Search.semantic_search ("vector" = ANN index on vecteur);
+without a matching index the candidate phase is an exact scan of the
+compact form, so the number isolates the quantization loss.
+"""
+import time
+import argparse
+
+import numpy as np
+import psycopg2
+from pgvector.psycopg2 import register_vector
+
+from Config import DB_CONFIG, TOP_K
+import VectorStore
+from Search import COMPACT_FORMS, _candidates, _embed_batch, _set_search_params, _topk_sql
+
+
+def sample_queries(cur, n: int, seed: int) -> list[np.ndarray]:
+    cur.execute("SELECT setseed(%s);", (seed / 2**31,))
+    cur.execute("SELECT vecteur FROM embeddings ORDER BY random() LIMIT %s;", (n,))
+    return [VectorStore.as_numpy(row[0]) for row in cur.fetchall()]
+
+
+def exact_topk(cur, vector: np.ndarray, k: int) -> list[int]:
+    cur.execute("SET LOCAL enable_indexscan = off;")
+    cur.execute("SET LOCAL enable_bitmapscan = off;")
+    cur.execute("SELECT id FROM embeddings ORDER BY vecteur <=> %s::vector LIMIT %s;", (vector, k))
+    return [row[0] for row in cur.fetchall()]
+
+
+def form_topk(cur, vector: np.ndarray, k: int, compact: str | None, overfetch: int) -> list[int]:
+    n = _candidates(k, compact, overfetch)
+    _set_search_params(cur, None, None, candidates=n)
+    cur.execute(_topk_sql(q="%(vec)s::vector", k="%(k)s", n="%(n)s",
+                          cols="\n        id,", compact=compact),
+                {"vec": vector, "k": k, "n": n})
+    position = [col.name for col in cur.description].index("id")
+    return [row[position] for row in cur.fetchall()]
+
+
+def index_sizes(cur) -> dict:
+    cur.execute("""
+        SELECT indexrelid::regclass::text, pg_relation_size(indexrelid)
+        FROM pg_index WHERE indrelid = 'embeddings'::regclass;
+    """)
+    sizes = dict(cur.fetchall())
+    cur.execute("SELECT pg_table_size('embeddings');")
+    sizes["embeddings (table)"] = cur.fetchone()[0]
+    return sizes
+
+
+def main(k: int = TOP_K, n_queries: int = 200, questions: str | None = None,
+         forms: list[str] | None = None, overfetch: list[int] | None = None, seed: int = 0):
+    forms     = forms or ["vector", *COMPACT_FORMS]
+    overfetch = overfetch or [10]
+    conn = psycopg2.connect(**DB_CONFIG)
+    register_vector(conn)
+
+    with conn.cursor() as cur:
+        if questions:
+            with open(questions, encoding="utf-8") as f:
+                queries = list(_embed_batch([line.strip() for line in f if line.strip()]))
+        else:
+            queries = sample_queries(cur, n_queries, seed)
+        conn.commit()
+        print(f"🎯 {len(queries)} queries, recall@{k} against an exact scan\n")
+
+        truth = []
+        for vector in queries:
+            truth.append(set(exact_topk(cur, vector, k)))
+            conn.commit()
+
+        print(f"{'form':<10}{'over-fetch':>11}{'recall@k':>10}{'ms/query':>10}")
+        for form in forms:
+            compact = None if form == "vector" else form
+            for factor in (overfetch if compact else [1]):
+                hits, elapsed = 0, 0.0
+                try:
+                    for vector, expected in zip(queries, truth):
+                        t0 = time.perf_counter()
+                        found = form_topk(cur, vector, k, compact, factor)
+                        elapsed += time.perf_counter() - t0
+                        conn.commit()
+                        hits += len(expected.intersection(found))
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    print(f"{form:<10}{'—':>11}   ⚠️  {str(e).splitlines()[0]} (pgvector >= 0.7 needed)")
+                    continue
+                recall = hits / max(1, sum(len(t) for t in truth))
+                print(f"{form:<10}{(str(factor) + '×') if compact else '—':>11}"
+                      f"{recall:>10.3f}{1000 * elapsed / len(queries):>10.2f}")
+
+        print("\n📦 On-disk sizes")
+        for name, size in index_sizes(cur).items():
+            print(f"   {name:<40}{size / 1024:>10.0f} KB")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--queries", type=int, default=200, help="stored fragments used as queries")
+    parser.add_argument("--questions", default=None, help="file with one question per line instead")
+    parser.add_argument("--forms", nargs="+", choices=["vector", *COMPACT_FORMS], default=None)
+    parser.add_argument("--overfetch", nargs="+", type=int, default=None,
+                        help="candidate multipliers to try (default 10)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.k, args.queries, args.questions, args.forms, args.overfetch, args.seed)
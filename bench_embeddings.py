@@ -0,0 +1,98 @@
+"""
+Embedding backends compared: PyTorch fp32 vs ONNX fp32 vs ONNX int8.
+
+    python bench_embeddings.py                    # parity + latency + throughput
+    python bench_embeddings.py --texts chunks.txt --threads 4
+
+Parity is the cosine similarity of each backend's vectors to the PyTorch
+ones; latency is one question per encode() call (what Search._embed does);
+throughput is batched encoding (what insert_data.embed_chunks does).
+"""
+import time
+import argparse
+
+import numpy as np
+
+from Config import EMBEDDING_MODEL, ONNX_THREADS, ONNX_PARITY_THRESHOLD
+from Embeddings import PARITY_SENTENCES, OnnxEncoder, load_embedding_model, onnx_dir, parity
+
+
+def load_backends(threads: int) -> dict:
+    backends = {}
+    try:
+        backends["torch fp32"] = load_embedding_model("torch")
+    except Exception as e:
+        print(f"⚠️  torch backend unavailable: {e}")
+    for label, quantized in (("onnx fp32", False), ("onnx int8", True)):
+        try:
+            backends[label] = OnnxEncoder(onnx_dir(), quantized=quantized, threads=threads)
+        except Exception as e:
+            print(f"⚠️  {label} unavailable: {e}")
+    return backends
+
+
+def latency(model, questions: list[str], repeat: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        for q in questions:
+            t0 = time.perf_counter()
+            model.encode(q, convert_to_numpy=True)
+            timings.append(time.perf_counter() - t0)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+
+
+def throughput(model, texts: list[str], batch_size: int) -> float:
+    t0 = time.perf_counter()
+    model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main(texts_path: str | None = None, n_texts: int = 512, batch_size: int = 64,
+         repeat: int = 5, threads: int = ONNX_THREADS):
+    texts = PARITY_SENTENCES
+    if texts_path:
+        with open(texts_path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()] or texts
+    corpus = (texts * (n_texts // len(texts) + 1))[:n_texts]
+
+    backends = load_backends(threads)
+    if not backends:
+        print("⚠️  No backend could be loaded.")
+        return
+    print(f"🧪 {EMBEDDING_MODEL} — {len(texts)} parity texts, {n_texts} texts for throughput\n")
+
+    for model in backends.values():   # first call pays graph / kernel initialisation
+        model.encode(texts[:2], convert_to_numpy=True)
+
+    reference = backends.get("torch fp32")
+    reference = reference.encode(texts, convert_to_numpy=True) if reference else None
+
+    print(f"{'backend':<12}{'min cos':>9}{'mean cos':>10}{'p50 ms':>9}{'p95 ms':>9}{'texts/s':>10}")
+    failed = []
+    for label, model in backends.items():
+        if reference is not None:
+            check = parity(reference, model.encode(texts, convert_to_numpy=True))
+            if check["min_cosine"] < ONNX_PARITY_THRESHOLD:
+                failed.append(label)
+            cos = f"{check['min_cosine']:>9.4f}{check['mean_cosine']:>10.4f}"
+        else:
+            cos = f"{'—':>9}{'—':>10}"
+        p50, p95 = latency(model, texts[:10], repeat)
+        rate = throughput(model, corpus, batch_size)
+        print(f"{label:<12}{cos}{p50 * 1000:>9.2f}{p95 * 1000:>9.2f}{rate:>10.1f}")
+
+    if failed:
+        print(f"\n❌ Parity below {ONNX_PARITY_THRESHOLD}: {', '.join(failed)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", default=None, help="file with one text per line")
+    parser.add_argument("--n-texts", type=int, default=512, help="texts encoded for throughput")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=ONNX_THREADS,
+                        help="ONNX Runtime intra-op threads (0 = default)")
+    args = parser.parse_args()
+    main(args.texts, args.n_texts, args.batch_size, args.repeat, args.threads)
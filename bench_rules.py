@@ -0,0 +1,231 @@
+"""
+Micro-benchmark: compiled rule engine in insert_data.py vs the original
+clean_lines / get_product_name / chunk_sections, with an output-identity check.
+
+    python bench_rules.py                 # PDFs found in PDF_FOLDER
+    python bench_rules.py --synthetic 500 # generated datasheet-like texts
+"""
+import os
+import re
+import time
+import random
+import argparse
+
+import insert_data
+from insert_data import NOISE_LINES, GOOD_SECTIONS, SKIP_SECTIONS, PDF_FOLDER
+
+
+# ── Original implementations (reference, kept verbatim) ──────────────────────
+def legacy_clean_lines(text: str) -> str:
+    cleaned = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        # Skip if matches any noise pattern
+        skip = False
+        for pat in NOISE_LINES:
+            if re.search(pat, line, re.IGNORECASE):
+                skip = True
+                break
+        if not skip and len(line) > 2:
+            cleaned.append(line)
+    return "\n".join(cleaned)
+
+
+def legacy_get_product_name(text: str, filename: str) -> str:
+    match = re.search(r'BVZyme\s+[\w\d®\s]+', text)
+    if match:
+        name = match.group(0).strip()
+        # Trim at first known section keyword
+        for kw in ["Bakery", "Product", "Enzyme", "Technical"]:
+            if kw in name:
+                name = name[:name.index(kw)].strip()
+        if len(name) > 3:
+            return name
+    for line in text.splitlines()[:6]:
+        line = line.strip()
+        if 4 < len(line) < 55:
+            return line
+    return re.sub(r'[_\-]+', ' ', os.path.splitext(filename)[0]).strip()
+
+
+def legacy_chunk_sections(text: str, product_name: str) -> list[str]:
+    header_pattern = "|".join(re.escape(h) for h in
+                               ["Product Description", "Effective material",
+                                "Application", "Function", "Dosage", "Activity",
+                                "Allergens", "Storage", "Description du produit",
+                                "Matière active", "Fonction", "Dosage recommandé",
+                                "Allergènes", "Conservation"])
+
+    pattern = re.compile(rf'(?im)^({header_pattern})\s*:?\s*$|^({header_pattern})\s*:', )
+    parts   = pattern.split(text)
+
+    chunks = []
+
+    if len(parts) <= 1:
+        # No sections — use whole cleaned text as one chunk
+        paras = [p.strip() for p in re.split(r'\n{2,}', text) if len(p.strip()) > 30]
+        return [f"[{product_name}] {p}" for p in paras]
+
+    i = 0
+    while i < len(parts):
+        part = parts[i]
+        if part is None:
+            i += 1
+            continue
+        part = part.strip()
+        if not part:
+            i += 1
+            continue
+
+        # Check if this part is a section header
+        if part.lower() in GOOD_SECTIONS:
+            header  = part
+            content = parts[i + 1].strip() if i + 1 < len(parts) else ""
+            content = re.sub(r'\n+', ' ', content).strip()
+            content = re.sub(r'\s{2,}', ' ', content)
+
+            if content and len(content) > 8:
+                chunk = f"[{product_name}] {header}: {content}"
+                if len(chunk) > 650:
+                    chunk = chunk[:647] + "..."
+                chunks.append(chunk)
+            i += 2
+        elif part.lower() in SKIP_SECTIONS:
+            i += 2  # skip header + content
+        else:
+            i += 1
+
+    if not chunks:
+        # Fallback: cleaned text paragraph by paragraph
+        for para in re.split(r'\n', text):
+            para = para.strip()
+            if len(para) > 30:
+                chunks.append(f"[{product_name}] {para}")
+
+    return chunks
+
+
+# ── Corpus ────────────────────────────────────────────────────────────────────
+_WORDS = ["enzyme", "xylanase", "amylase", "dough", "flour", "bread", "volume",
+          "stability", "ppm", "activity", "crumb", "softness", "store", "dry", "place"]
+_NOISE = ["VTR & beyond GmbH", "Stresemannstr. 10, Berlin Germany", "Tel: +49 30 123",
+          "Mail: info@vtr.com", "www.vtr-beyond.com", "Food Enzyme Innovators", "P", "5"]
+_HEADERS = ["Product Description", "Function", "Dosage", "Dosage recommandé",
+            "Allergens", "Storage", "Microbiology", "Package", "Conservation"]
+
+
+def synthetic_text(rng: random.Random) -> str:
+    lines = [f"BVZyme TG{rng.randint(100, 999)} Bakery Enzyme", "Technical Data Sheet"]
+    for header in rng.sample(_HEADERS, k=6):
+        if rng.random() < 0.05:
+            lines.append(header)   # header alone on its line
+        else:
+            lines.append(f"{header}: " + " ".join(rng.choices(_WORDS, k=rng.randint(3, 12))))
+        for _ in range(rng.randint(1, 4)):
+            lines.append(" ".join(rng.choices(_WORDS, k=rng.randint(4, 14))))
+            if rng.random() < 0.3:
+                lines.append(rng.choice(_NOISE))
+    return "\n".join(lines)
+
+
+def load_corpus(synthetic: int, seed: int) -> list[tuple[str, str]]:
+    if synthetic:
+        rng = random.Random(seed)
+        return [(f"synthetic_{i}.pdf", synthetic_text(rng)) for i in range(synthetic)]
+    pdf_files = sorted(f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf"))
+    corpus = []
+    for pdf_file in pdf_files:
+        try:
+            corpus.append((pdf_file, insert_data.extract_text(os.path.join(PDF_FOLDER, pdf_file))))
+        except Exception as e:
+            print(f"⚠️  {pdf_file}: {e}")
+    return corpus
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────────────
+def run_pipeline(corpus, clean, product, chunk):
+    out = []
+    for filename, raw in corpus:
+        try:
+            text = clean(raw)
+            name = product(text, filename) if text else None
+            out.append((text, name, chunk(text, name) if text else []))
+        except Exception as e:
+            out.append(("error", f"{type(e).__name__}: {e}"))
+    return out
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def main(synthetic: int = 0, repeat: int = 5, seed: int = 0):
+    corpus = load_corpus(synthetic, seed)
+    if not corpus:
+        print("⚠️  No PDFs found — use --synthetic N.")
+        return
+    print(f"📚 {len(corpus)} documents, best of {repeat} runs\n")
+
+    legacy = (legacy_clean_lines, legacy_get_product_name, legacy_chunk_sections)
+    engine = (insert_data.clean_lines, insert_data.get_product_name, insert_data.chunk_sections)
+
+    # ── Identity check ──
+    expected = run_pipeline(corpus, *legacy)
+    actual   = run_pipeline(corpus, *engine)
+    legacy_errors = sum(1 for e in expected if e[0] == "error")
+    mismatches = [corpus[i][0] for i, (e, a) in enumerate(zip(expected, actual))
+                  if e[0] != "error" and e != a]
+    print(f"🔍 Identical output: {len(corpus) - legacy_errors - len(mismatches)}"
+          f"/{len(corpus) - legacy_errors}")
+    if legacy_errors:
+        print(f"   ({legacy_errors} documents crash the original chunk_sections "
+              f"on a header alone on its line — not compared)")
+    for name in mismatches:
+        print(f"   ❌ {name}")
+
+    # ── Stage timings ──
+    texts = [(f, legacy_clean_lines(raw)) for f, raw in corpus]
+    names = [legacy_get_product_name(t, f) for f, t in texts]
+    stages = [
+        ("clean_lines",      lambda fn: [fn(raw) for _, raw in corpus], 0),
+        ("get_product_name", lambda fn: [fn(t, f) for f, t in texts], 1),
+        ("chunk_sections",   lambda fn: [_safe(fn, t, n) for (_, t), n in zip(texts, names)], 2),
+    ]
+    print()
+    print(f"{'stage':<18}{'original':>12}{'compiled':>12}{'speedup':>10}")
+    for label, run, idx in stages:
+        before = best_of(repeat, lambda: run(legacy[idx]))
+        after  = best_of(repeat, lambda: run(engine[idx]))
+        print(f"{label:<18}{before * 1000:>10.2f}ms{after * 1000:>10.2f}ms"
+              f"{before / after if after else float('inf'):>9.1f}x")
+
+    insert_data.RULE_STATS.reset()
+    run_pipeline(corpus, *engine)
+    print()
+    print(insert_data.RULE_STATS.report())
+    if mismatches:
+        raise SystemExit(1)
+
+
+def _safe(fn, text, product_name):
+    try:
+        return fn(text, product_name)
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="benchmark on N generated texts instead of PDF_FOLDER")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args.synthetic, args.repeat, args.seed)
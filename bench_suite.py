@@ -0,0 +1,493 @@
+"""
+Retrieval + ingestion benchmark on a synthetic datasheet corpus.
+
+    python bench_suite.py --rows 10000 --dsn "host=localhost dbname=bench"   # pgvector, bench schema
+    python bench_suite.py --rows 1000000 --backend numpy --concurrency 1 8 32
+    python bench_suite.py --rows 100000 --compare bench_results/<previous>.json
+
+The corpus mimics insert_data.py output: "[BVZyme XX123] Section: ..."
+fragments with product / section / language / filename metadata, and
+clustered unit vectors (one centre per product family, one offset per
+section) so ANN indexes behave as on real embeddings. No model is needed
+except for the optional embed stage.
+
+  - pgvector : a local Postgres + pgvector given by `--dsn` (never the
+               DB_CONFIG database unless --allow-config-db). The rows are
+               loaded into the `--schema` schema (dropped and recreated)
+               with insert_data.BulkLoader + create_vector_index, and
+               queried with the same SQL as Search.semantic_search.
+  - numpy    : the VectorStore export written in `--workdir` is searched.
+
+Measured: per-query latency p50/p95/p99 at each concurrency level, recall@k
+against an exact scan, ingestion throughput per stage (clean / product /
+chunk / embed on synthetic texts, load / index on the generated rows),
+memory (peak RSS, store / table / index sizes). Results are written as JSON
+to `--out` (default bench_results/<timestamp>-<backend>-<rows>.json).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import VectorStore
+from Config import DB_CONFIG, EMBEDDING_DIM, TOP_K, VECTOR_INDEX_TYPE, COMPACT_VECTORS
+from bench_rules import synthetic_text
+
+
+# ── Synthetic corpus ──────────────────────────────────────────────────────────
+FRAGMENTS_PER_DOC = 8
+_FAMILIES = ["TG", "AF", "HCF", "GOX", "XYL", "LIP", "AMG", "FAA"]
+_SECTIONS = ["Product Description", "Effective material", "Application", "Function",
+             "Dosage", "Activity", "Allergens", "Storage"]
+_WORDS    = ["enzyme", "xylanase", "amylase", "dough", "flour", "bread", "volume",
+             "stability", "ppm", "activity", "crumb", "softness", "storage", "dry",
+             "glucose", "oxidase", "lipase", "gluten", "ascorbic", "acid", "shelf", "life"]
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def synthetic_rows(n: int, dim: int = EMBEDDING_DIM, seed: int = 0, block: int = 10_000):
+    """
+    Yield n (id, id_document, texte_fragment, vector, product, section,
+    language, filename) rows, generated `block` vectors at a time so 1M rows
+    never sit in memory at once.
+    """
+    rng      = np.random.default_rng(seed)
+    words    = random.Random(seed)
+    families = _unit_rows(rng.standard_normal((64, dim)))
+    sections = _unit_rows(rng.standard_normal((len(_SECTIONS), dim)))
+    for start in range(0, n, block):
+        rows    = np.arange(start, min(n, start + block))
+        doc_ids = rows // FRAGMENTS_PER_DOC
+        family  = doc_ids % len(families)
+        section = rows % len(_SECTIONS)
+        # noise of norm ≈ 0.7 around family + 0.5 × section
+        vectors = families[family] + 0.5 * sections[section] \
+            + 0.7 * rng.standard_normal((len(rows), dim)) / np.sqrt(dim)
+        vectors = _unit_rows(vectors).astype(np.float32)
+        for i, row in enumerate(rows):
+            doc_id  = int(doc_ids[i])
+            product = f"BVZyme {_FAMILIES[doc_id % len(_FAMILIES)]}{100 + doc_id % 900}"
+            header  = _SECTIONS[section[i]]
+            text    = f"[{product}] {header}: " + " ".join(words.choices(_WORDS, k=words.randint(6, 40)))
+            yield (int(row) + 1, doc_id + 1, text, vectors[i], product, header,
+                   "fr" if doc_id % 3 == 0 else "en", f"synthetic_{doc_id:07d}.pdf")
+
+
+def synthetic_queries(store: VectorStore.NumpyVectorStore, n: int, seed: int) -> np.ndarray:
+    """Stored vectors plus noise: questions close to, but not on, a fragment."""
+    rng  = np.random.default_rng(seed + 1)
+    rows = np.sort(rng.choice(len(store), size=min(n, len(store)), replace=False))
+    base = np.asarray(store.vectors[rows], dtype=np.float32)
+    return _unit_rows(base + 0.3 * rng.standard_normal(base.shape) / np.sqrt(base.shape[1])) \
+        .astype(np.float32)
+
+
+def build_store(path: str, rows: int, seed: int, reuse: bool) -> tuple[VectorStore.NumpyVectorStore, float]:
+    """Write the synthetic corpus as a VectorStore export (also the ground-truth matrix)."""
+    tag = f"synthetic-{seed}"
+    if reuse and os.path.exists(os.path.join(path, VectorStore.META)):
+        store = VectorStore.NumpyVectorStore(path)
+        if store.meta["count"] == rows and store.meta["model"] == tag:
+            print(f"♻️  Reusing {rows} synthetic rows in {path}/")
+            return store, 0.0
+    print(f"🧬 Generating {rows} synthetic rows into {path}/ ...")
+    t0 = time.perf_counter()
+    VectorStore.write_store(path, synthetic_rows(rows, seed=seed), rows, EMBEDDING_DIM, tag,
+                            ("product", "section", "language", "filename"))
+    return VectorStore.NumpyVectorStore(path), time.perf_counter() - t0
+
+
+# ── Memory ────────────────────────────────────────────────────────────────────
+def rss_mb() -> dict:
+    """Current and peak resident set size of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # KB on Linux
+    if sys.platform == "darwin":
+        peak /= 1024                                                   # bytes on macOS
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        pass
+    return {"rss_mb": round(current, 1) if current else None, "peak_rss_mb": round(peak, 1)}
+
+
+def dir_size_mb(path: str) -> float:
+    return round(sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20, 1)
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+class NumpyTarget:
+    name = "numpy"
+
+    def __init__(self, store: VectorStore.NumpyVectorStore):
+        self.store = store
+
+    def searcher(self, top_k: int):
+        store = self.store
+        return lambda vector: list(store.ids[store.search(vector, top_k)[0]])
+
+    def sizes(self) -> dict:
+        return {"store_mb": dir_size_mb(self.store.path)}
+
+    def close(self):
+        pass
+
+
+class PgvectorTarget:
+    """The synthetic rows in their own schema, queried with Search's top-k SQL."""
+    name = "pgvector"
+
+    def __init__(self, dsn: str, schema: str, ef_search: int | None, probes: int | None,
+                 allow_config_db: bool = False):
+        from psycopg2.extensions import parse_dsn
+        self.config    = parse_dsn(dsn)
+        if self.config.get("host", "localhost") == DB_CONFIG["host"] and not allow_config_db:
+            raise SystemExit(f"❌ --dsn points at the application database ({DB_CONFIG['host']}); "
+                             "use a local Postgres, or pass --allow-config-db")
+        self.schema    = schema
+        self.ef_search = ef_search
+        self.probes    = probes
+        self._conns    = []
+
+    def _schema(self):
+        from psycopg2 import sql
+        return sql.Identifier(self.schema)
+
+    def connect(self):
+        import psycopg2
+        from psycopg2 import sql
+        from pgvector.psycopg2 import register_vector
+        conn = psycopg2.connect(**self.config)
+        register_vector(conn)
+        # A session SET rather than a startup "options" parameter, which poolers reject
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("SET search_path TO {}, public;").format(self._schema()))
+        conn.commit()
+        self._conns.append(conn)
+        return conn
+
+    def load(self, store: VectorStore.NumpyVectorStore, reuse: bool) -> dict:
+        import psycopg2
+        from psycopg2 import sql
+        from insert_data import BulkLoader, ensure_schema, create_vector_index
+
+        with psycopg2.connect(**self.config) as admin, admin.cursor() as cur:
+            # Extension in public first, so it is not created inside the bench schema
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            table = sql.SQL("{}.embeddings").format(self._schema())
+            cur.execute("SELECT to_regclass(%s);", (table.as_string(cur),))
+            if reuse and cur.fetchone()[0]:
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {};").format(table))
+                if cur.fetchone()[0] == len(store):
+                    print(f"♻️  Reusing {len(store)} rows in schema '{self.schema}'")
+                    return {}
+            cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(self._schema()))
+            cur.execute(sql.SQL("CREATE SCHEMA {};").format(self._schema()))
+        admin.close()
+
+        conn = self.connect()
+        with conn.cursor() as cur:
+            ensure_schema(cur)
+        conn.commit()
+
+        print(f"📥 Loading {len(store)} rows into {self.schema}.embeddings ...")
+        t0 = time.perf_counter()
+        loader = BulkLoader(conn)
+        meta   = [store.columns[c] for c in ("product", "section", "language", "filename")]
+        codes  = [store.codes[c] for c in ("product", "section", "language", "filename")]
+        for row in range(len(store)):
+            loader.add(int(store.doc_ids[row]), store.fragment(row), store.vectors[row],
+                       tuple(values[code[row]] if code[row] >= 0 else None
+                             for values, code in zip(meta, codes)))
+        loader.close()
+        load_s = time.perf_counter() - t0
+
+        print(f"🧭 Building {VECTOR_INDEX_TYPE} index{f' ({COMPACT_VECTORS})' if COMPACT_VECTORS else ''} ...")
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            create_vector_index(cur)
+        conn.commit()
+        index_s = time.perf_counter() - t0
+        return {
+            "load":  {"seconds": round(load_s, 3), "rows_per_s": round(len(store) / load_s, 1)},
+            "index": {"seconds": round(index_s, 3), "rows_per_s": round(len(store) / index_s, 1)},
+        }
+
+    def searcher(self, top_k: int):
+        from Search import _candidates, _set_search_params, _topk_sql
+
+        conn = self.connect()
+        n    = _candidates(top_k)
+        sql  = _topk_sql(q="%(vec)s::vector", k="%(k)s", n="%(n)s", cols="\n        id,")
+
+        def search(vector):
+            with conn.cursor() as cur:
+                _set_search_params(cur, self.ef_search, self.probes, candidates=n)
+                cur.execute(sql, {"vec": vector, "k": top_k, "n": n})
+                position = [col.name for col in cur.description].index("id")
+                ids = [row[position] for row in cur.fetchall()]
+            conn.commit()
+            return ids
+        return search
+
+    def sizes(self) -> dict:
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT indexrelid::regclass::text, pg_relation_size(indexrelid)
+                FROM pg_index WHERE indrelid = 'embeddings'::regclass;
+            """)
+            sizes = {f"{name}_mb": round(size / 2**20, 1) for name, size in cur.fetchall()}
+            cur.execute("SELECT pg_table_size('embeddings');")
+            sizes["table_mb"] = round(cur.fetchone()[0] / 2**20, 1)
+        conn.commit()
+        return sizes
+
+    def server_versions(self) -> dict:
+        conn = self.connect()
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version;")
+            postgres = cur.fetchone()[0]
+            cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+            pgvector = cur.fetchone()[0]
+        conn.commit()
+        return {"postgres": postgres, "pgvector": pgvector}
+
+    def close(self):
+        for conn in self._conns:
+            conn.close()
+        self._conns.clear()
+
+
+# ── Measurements ──────────────────────────────────────────────────────────────
+def percentiles(seconds: list[float]) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "mean_ms": round(float(ms.mean()), 3)}
+
+
+def measure_latency(target, queries: np.ndarray, top_k: int, concurrency: int) -> dict:
+    """Every query once, spread over `concurrency` threads each with its own searcher."""
+    shards = [queries[i::concurrency] for i in range(concurrency)]
+    searchers = [target.searcher(top_k) for _ in shards]
+    for search, shard in zip(searchers, shards):   # warm caches / connections
+        if len(shard):
+            search(shard[0])
+
+    def run(search, shard):
+        timings = []
+        for vector in shard:
+            t0 = time.perf_counter()
+            search(vector)
+            timings.append(time.perf_counter() - t0)
+        return timings
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = [t for part in pool.map(run, searchers, shards) for t in part]
+    wall = time.perf_counter() - t0
+    return {**percentiles(timings), "qps": round(len(timings) / wall, 1), "queries": len(timings)}
+
+
+def measure_recall(target, store: VectorStore.NumpyVectorStore, queries: np.ndarray,
+                   top_k: int) -> float:
+    search = target.searcher(top_k)
+    hits = total = 0
+    for (rows, _), vector in zip(store.search_many(queries, top_k), queries):
+        expected = {int(i) for i in store.ids[rows]}
+        hits    += len(expected.intersection(int(i) for i in search(vector)))
+        total   += len(expected)
+    return round(hits / total, 4) if total else 0.0
+
+
+def measure_ingest_stages(n_docs: int, seed: int, embed: bool) -> dict:
+    """chunks/s of insert_data's text stages (and embedding) on synthetic datasheets."""
+    import insert_data
+
+    rng   = random.Random(seed)
+    raw   = [(f"synthetic_{i}.pdf", synthetic_text(rng)) for i in range(n_docs)]
+    stats = {}
+
+    t0 = time.perf_counter()
+    texts = [(f, insert_data.clean_lines(r)) for f, r in raw]
+    stats["clean"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    names = [insert_data.get_product_name(t, f) for f, t in texts]
+    stats["product"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    chunks = [c for (_, t), name in zip(texts, names) for c in insert_data.chunk_sections(t, name)]
+    stats["chunk"] = time.perf_counter() - t0
+
+    result = {stage: {"seconds": round(s, 4), "chunks_per_s": round(len(chunks) / s, 1) if s else None}
+              for stage, s in stats.items()}
+    result["documents"], result["chunks"] = n_docs, len(chunks)
+
+    if embed:
+        try:
+            from Embeddings import load_embedding_model, model_key
+            model = load_embedding_model()
+            insert_data.embed_chunks(model, chunks[:64])          # first call pays initialisation
+            t0 = time.perf_counter()
+            insert_data.embed_chunks(model, chunks)
+            seconds = time.perf_counter() - t0
+            result["embed"] = {"seconds": round(seconds, 3), "chunks_per_s": round(len(chunks) / seconds, 1),
+                               "model": model_key()}
+        except Exception as e:
+            print(f"⚠️  embed stage skipped: {e}")
+            result["embed"] = {"skipped": f"{type(e).__name__}: {e}"}
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit,
+            "host": platform.node(), "cpus": os.cpu_count(), "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform()}
+
+
+# ── Comparison ────────────────────────────────────────────────────────────────
+def _flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(_flatten(item, f"{prefix}{key}."))
+        return out
+    return {prefix[:-1]: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(previous: dict, current: dict):
+    """Print every numeric metric that changed between two result files."""
+    before, after = _flatten(previous.get("results", {})), _flatten(current["results"])
+    print(f"\n📈 vs {previous['environment'].get('timestamp')} "
+          f"({previous['environment'].get('commit')}, {previous['config'].get('rows')} rows)")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        if old != new:
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "—"
+            print(f"   {key:<48}{old:>12}{new:>12}{change:>9}")
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+def main(rows: int = 10_000, backend: str = "pgvector", n_queries: int = 1000,
+         recall_queries: int = 200, concurrency: list[int] | None = None, top_k: int = TOP_K,
+         ef_search: int | None = None, probes: int | None = None, ingest_docs: int = 500,
+         embed: bool = True, seed: int = 0, workdir: str = ".bench", schema: str = "bench",
+         reuse: bool = False, out: str | None = None, compare_to: str | None = None,
+         dsn: str | None = None, allow_config_db: bool = False) -> dict:
+    concurrency = concurrency or [1, 4, 16]
+    if backend == "pgvector" and not dsn:
+        raise SystemExit("❌ --dsn is required for the pgvector backend (a local Postgres + pgvector)")
+    target = PgvectorTarget(dsn, schema, ef_search, probes, allow_config_db) \
+        if backend == "pgvector" else None
+    config = {"rows": rows, "backend": backend, "queries": n_queries, "recall_queries": recall_queries,
+              "concurrency": concurrency, "top_k": top_k, "ef_search": ef_search, "probes": probes,
+              "index_type": VECTOR_INDEX_TYPE, "compact": COMPACT_VECTORS, "seed": seed}
+    results = {"memory": {}}
+
+    print(f"⚙️  Ingestion stages on {ingest_docs} synthetic datasheets ...")
+    results["ingest"] = measure_ingest_stages(ingest_docs, seed, embed)
+
+    store, generate_s = build_store(os.path.join(workdir, f"store-{rows}"), rows, seed, reuse)
+    if generate_s:
+        results["ingest"]["generate"] = {"seconds": round(generate_s, 3),
+                                         "rows_per_s": round(rows / generate_s, 1)}
+    results["memory"]["after_generate"] = rss_mb()
+
+    env = environment()
+    if backend == "numpy":
+        target = NumpyTarget(store)
+    else:
+        results["ingest"].update(target.load(store, reuse))
+        env.update(target.server_versions())
+
+    try:
+        queries = synthetic_queries(store, n_queries, seed)
+        print(f"🎯 recall@{top_k} on {min(recall_queries, len(queries))} queries ...")
+        results["recall_at_k"] = measure_recall(target, store, queries[:recall_queries], top_k)
+
+        results["latency"] = {}
+        for level in concurrency:
+            print(f"⏱️  {len(queries)} queries, concurrency {level} ...")
+            results["latency"][f"c{level}"] = measure_latency(target, queries, top_k, level)
+        results["memory"]["after_search"] = rss_mb()
+        results["memory"]["sizes"] = target.sizes()
+    finally:
+        target.close()
+
+    report = {"environment": env, "config": config, "results": results}
+
+    print(f"\n📊 {backend}, {rows} rows, recall@{top_k} = {results['recall_at_k']}")
+    print(f"{'concurrency':<13}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/s':>10}")
+    for level, stats in results["latency"].items():
+        print(f"{level[1:]:<13}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['qps']:>10.1f}")
+    print("\n⚙️  Ingestion throughput")
+    for stage, stats in results["ingest"].items():
+        if isinstance(stats, dict) and "seconds" in stats:
+            rate = stats.get("chunks_per_s") or stats.get("rows_per_s") or 0.0
+            print(f"   {stage:<10}{stats['seconds']:>10.3f}s{rate:>14.1f}/s")
+    print(f"\n💾 Peak RSS {results['memory']['after_search']['peak_rss_mb']} MB, "
+          + ", ".join(f"{k} {v}" for k, v in results["memory"]["sizes"].items()))
+
+    out = out or os.path.join("bench_results",
+                              f"{time.strftime('%Y%m%d-%H%M%S')}-{backend}-{rows}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {out}")
+
+    if compare_to:
+        with open(compare_to) as f:
+            compare(json.load(f), report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="synthetic fragments (10k – 1M)")
+    parser.add_argument("--backend", choices=["pgvector", "numpy"], default="pgvector")
+    parser.add_argument("--queries", type=int, default=1000, help="queries per concurrency level")
+    parser.add_argument("--recall-queries", type=int, default=200)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=None,
+                        help="client threads to test (default 1 4 16)")
+    parser.add_argument("-k", "--top-k", type=int, default=TOP_K)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--probes", type=int, default=None)
+    parser.add_argument("--ingest-docs", type=int, default=500,
+                        help="synthetic datasheets for the clean/product/chunk/embed stages")
+    parser.add_argument("--no-embed", action="store_true", help="skip the embedding stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=".bench", help="where the synthetic store is written")
+    parser.add_argument("--dsn", default=None,
+                        help='libpq DSN of the benchmark database, e.g. "host=localhost dbname=bench" '
+                             "(required for --backend pgvector)")
+    parser.add_argument("--allow-config-db", action="store_true",
+                        help="allow --dsn to point at the DB_CONFIG host (its --schema is dropped!)")
+    parser.add_argument("--schema", default="bench", help="Postgres schema used (dropped and recreated)")
+    parser.add_argument("--reuse", action="store_true",
+                        help="keep the generated store / loaded table from a previous run of the same size")
+    parser.add_argument("--out", default=None, help="JSON results file")
+    parser.add_argument("--compare", default=None, help="previous JSON results to diff against")
+    args = parser.parse_args()
+    main(args.rows, args.backend, args.queries, args.recall_queries, args.concurrency, args.top_k,
+         args.ef_search, args.probes, args.ingest_docs, not args.no_embed, args.seed,
+         args.workdir, args.schema, args.reuse, args.out, args.compare,
+         args.dsn, args.allow_config_db)
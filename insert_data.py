@@ -1,14 +1,43 @@
 
 
+import io
 import os
 import re
+import time
+import struct
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import psycopg2
 import pdfplumber
-from sentence_transformers import SentenceTransformer
-from Config import DB_CONFIG, EMBEDDING_MODEL
+from pdfminer.fontmetrics import FONT_METRICS
+from pypdf import PdfReader
+from psycopg2.extras import execute_values
+from pgvector.psycopg2 import register_vector
+from Config import (
+    DB_CONFIG,
+    VECTOR_INDEX_TYPE,
+    HNSW_M, HNSW_EF_CONSTRUCTION, IVFFLAT_LISTS,
+    INGEST_BATCH_SIZE, INGEST_SORT_BY_LENGTH, INGEST_ENCODE_PROCESSES,
+    INGEST_LOAD_METHOD, INGEST_LOAD_BATCH, INGEST_COMMIT_EVERY,
+    INGEST_EXTRACT_WORKERS, INGEST_STREAM_CHUNKS, INGEST_EXTRACT_MODE,
+    EMBEDDING_DIM, SEARCH_BACKEND, NUMPY_INDEX_DIR, COMPACT_VECTORS,
+    METRICS_LOG, METRICS_FILE, INGEST_EMBED_CACHE_PATH, EMBED_SERVER_URL,
+)
+import Metrics
+import VectorStore
+from ChunkCache import ChunkEmbeddingCache, embed_with_cache
+from Search import COMPACT_FORMS, vector_index_name
+from Embeddings import load_embedding_model, model_key
 
 PDF_FOLDER = "."
 
+# Bump whenever extraction / cleaning / chunking rules change: every document
+# recorded with an older version is re-processed on the next run.
+PIPELINE_VERSION = "4"
+
 
 NOISE_LINES = [
     r'vtr\s*&?\s*beyond',
@@ -50,96 +79,397 @@ SKIP_SECTIONS = {
 }
 
 
-# ── Text extraction with pdfplumber ──────────────────────────────────────────
-def extract_text(pdf_path: str) -> str:
-    lines_out = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            # Extract words with their x position to detect columns
-            words = page.extract_words(x_tolerance=3, y_tolerance=3)
-            if not words:
+# ── Text extraction ───────────────────────────────────────────────────────────
+# Words starting right of this fraction of the page width are address/logo
+# noise on these PDFs (right column) and are dropped.
+COLUMN_LIMIT = 0.5 * 1.1
+# "crop" mode keeps a small margin right of the limit so words straddling it
+# are still extracted whole, then filters them exactly like "full" mode.
+CROP_MARGIN  = 0.10
+
+EXTRACT_MODES = ("full", "crop", "pypdf", "auto")
+
+
+def _group_lines(words, limit: float, x_key: str = "x0", y_key: str = "top"):
+    """Bucket words by line (~5px), sort top-to-bottom and keep the left column."""
+    lines = {}
+    for w in words:
+        y = round(w[y_key] / 5) * 5  # bucket by ~5px
+        lines.setdefault(y, []).append(w)
+
+    # Sort lines top to bottom
+    for y in sorted(lines.keys()):
+        row_words = sorted(lines[y], key=lambda w: w[x_key])
+        # Only keep left column (main content)
+        line_text = " ".join(w["text"] for w in row_words if w[x_key] < limit).strip()
+        if line_text:
+            yield line_text
+
+
+def _plumber_page_lines(page, crop: bool) -> list[str]:
+    limit = page.width * COLUMN_LIMIT
+    if crop:
+        x0, top, x1, bottom = page.bbox
+        right = min(x1, max(x0, x0 + page.width * (COLUMN_LIMIT + CROP_MARGIN)))
+        # Layout/word analysis only runs on the content column
+        page = page.crop((x0, top, right, bottom))
+    words = page.extract_words(x_tolerance=3, y_tolerance=3)
+    return list(_group_lines(words, limit))
+
+
+def _glyph_widths(font) -> tuple[dict, float]:
+    """
+    (character → advance width in 1/1000 em, width of any other character)
+    for a pypdf font dictionary: its /Widths array, codes read as WinAnsi
+    (cp1252), else the standard-14 metrics shipped with pdfminer. Other
+    characters (CID fonts, custom encodings) get the font's mean width.
+    """
+    if font is None:
+        return {}, 500.0
+    base   = str(font.get("/BaseFont", "")).lstrip("/").split("+")[-1]    # "ABCDEF+Arial" subsets
+    widths = {}
+    if "/Widths" in font:
+        for code, width in enumerate(font["/Widths"], start=int(font.get("/FirstChar", 0))):
+            try:
+                widths[bytes([code]).decode("cp1252")] = float(width.get_object())
+            except (ValueError, UnicodeDecodeError):
                 continue
+    elif base in FONT_METRICS:
+        widths = dict(FONT_METRICS[base][1])
+    known = [w for w in widths.values() if w > 0]
+    if known:
+        return widths, sum(known) / len(known)
+    if font.get("/Subtype") == "/Type0":
+        return widths, float(font["/DescendantFonts"][0].get_object().get("/DW", 1000))
+    return widths, 500.0
+
+
+def _pypdf_page_lines(page) -> list[str]:
+    """
+    Left-column lines of a pypdf page. pypdf reports each text run at the
+    position of its first glyph; the run is split into words, each placed by
+    advancing over the glyph widths of the font, so the column limit applies
+    per word as in the pdfplumber modes. Character / word spacing and
+    horizontal scaling operators are not seen by the visitor, so positions
+    past the first word of a run are approximate on PDFs that use them.
+    """
+    box    = page.mediabox
+    limit  = float(box.width) * COLUMN_LIMIT
+    words  = []
+    fonts  = {}
+
+    def visit(text, cm, tm, font_dict, font_size):
+        # pypdf prefixes a run with the separator it inferred (" ", "\n"): not glyphs
+        text = text.lstrip()
+        if not text:
+            return
+        key = id(font_dict)
+        if key not in fonts:
+            fonts[key] = _glyph_widths(font_dict)
+        widths, default = fonts[key]
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4] - float(box.left)
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        scale   = font_size * (tm[0] * cm[0] + tm[1] * cm[2]) / 1000    # 1/1000 em → page units
+        advance = 0.0
+        for piece in re.split(r"(\s+)", text):
+            if piece and not piece.isspace():
+                words.append({"text": piece, "x0": x + advance * scale, "top": float(box.top) - y})
+            advance += sum(widths.get(char, default) for char in piece)
+
+    page.extract_text(visitor_text=visit)
+    return list(_group_lines(words, limit))
+
+
+def _close_page(page):
+    # Drop pdfplumber's per-page object caches (chars, layout) once done
+    close = getattr(page, "close", None) or page.flush_cache
+    close()
+
+
+def iter_pdf_lines(pdf_path: str, mode: str = INGEST_EXTRACT_MODE):
+    """
+    Yield the left-column text lines of a PDF, page by page.
+
+    Modes:
+      - "full"  : pdfplumber word extraction on the whole page (original behaviour)
+      - "crop"  : pdfplumber on the page cropped to the content column
+      - "pypdf" : pypdf text extraction, word positions from the text matrices
+                  and font widths; much faster for plain text PDFs
+      - "auto"  : pypdf, falling back to cropped pdfplumber for pages where
+                  pypdf finds no text
+    Each page's caches are released before moving on, so memory stays flat
+    on long catalogs.
+    """
+    if mode not in EXTRACT_MODES:
+        raise ValueError(f"Unknown extract mode: {mode!r} (choose from {EXTRACT_MODES})")
+
+    if mode in ("full", "crop"):
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                try:
+                    yield from _plumber_page_lines(page, crop=(mode == "crop"))
+                finally:
+                    _close_page(page)
+        return
+
+    reader  = PdfReader(pdf_path)
+    plumber = None
+    try:
+        for i, page in enumerate(reader.pages):
+            lines = _pypdf_page_lines(page)
+            if not lines and mode == "auto":
+                if plumber is None:
+                    plumber = pdfplumber.open(pdf_path)
+                fallback = plumber.pages[i]
+                try:
+                    lines = _plumber_page_lines(fallback, crop=True)
+                finally:
+                    _close_page(fallback)
+            yield from lines
+    finally:
+        if plumber is not None:
+            plumber.close()
+
+
+def extract_text(pdf_path: str, mode: str = INGEST_EXTRACT_MODE) -> str:
+    return "\n".join(iter_pdf_lines(pdf_path, mode))
+
+
+# ── Compiled rule engine (built once at import) ──────────────────────────────
+# Noise rules are matched in two stages. Stage 1: a cheap substring test on
+# the literal text each pattern must start with (e.g. "stresemann", "tel",
+# "+49"). Stage 2: the precompiled regex, only for rules whose literal is
+# present. The lower-cased prefilter is exact for ASCII lines. Other lines
+# go straight to stage 2. Rules are tried in NOISE_LINES order, so the
+# result and the hit attribution match the original loop.
+_REGEX_META   = set(".^$*+?{}[]|()\\")
+_MAY_REPEAT_0 = set("*?{")      # the character before may be absent from a match
+
+
+def _leading_literal(pattern: str) -> str:
+    """
+    Text every match of `pattern` starts with: its characters up to the
+    first regex metacharacter (escaped punctuation counts as literal).
+    "" for a pattern with an alternation, whose branches share no prefix.
+    """
+    if "|" in re.sub(r"\\.", "", pattern):
+        return ""
+    literal, i = "", 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            char = pattern[i + 1:i + 2]
+            if not char or char.isalnum():      # \d, \b, \1... are not literal text
+                break
+            i += 2
+        elif char in _REGEX_META:
+            break
+        else:
+            i += 1
+        if pattern[i:i + 1] in _MAY_REPEAT_0:
+            break
+        literal += char
+        if pattern[i:i + 1] == "+":
+            break
+    return literal.lower()
+
+
+_NOISE_RULES = [(pat, _leading_literal(pat), re.compile(pat, re.IGNORECASE))
+                for pat in NOISE_LINES]
+
+
+def _noise_rule(line: str) -> str | None:
+    """First NOISE_LINES pattern found in `line`, or None."""
+    if line.isascii():
+        low = line.lower()
+        for pat, literal, rx in _NOISE_RULES:
+            if (not literal or literal in low) and rx.search(line):
+                return pat
+        return None
+    for pat, _, rx in _NOISE_RULES:
+        if rx.search(line):
+            return pat
+    return None
+
+
+# Section map: lower-cased header → "keep" / "skip"
+SECTION_MAP = {**{h: "skip" for h in SKIP_SECTIONS}, **{h: "keep" for h in GOOD_SECTIONS}}
+
+# GOOD_SECTIONS header → (section stored in embeddings.section, language of the sheet).
+# French and English sheets share one section vocabulary so section='Dosage'
+# filters both.
+SECTION_META = {
+    "product description":    ("Product Description", "en"),
+    "effective material":     ("Effective material", "en"),
+    "application":            ("Application", "en"),
+    "function":               ("Function", "en"),
+    "dosage":                 ("Dosage", "en"),
+    "activity":               ("Activity", "en"),
+    "allergens":              ("Allergens", "en"),
+    "storage":                ("Storage", "en"),
+    "description du produit": ("Product Description", "fr"),
+    "matière active":         ("Effective material", "fr"),
+    "fonction":               ("Function", "fr"),
+    "dosage recommandé":      ("Dosage", "fr"),
+    "allergènes":             ("Allergens", "fr"),
+    "conservation":           ("Storage", "fr"),
+}
 
-            # Find page midpoint to separate left/right columns
-            page_mid = page.width / 2
+# Fallback language guess for fragments without a known header
+_FR_WORDS = re.compile(r"\b(le|la|les|des|du|et|est|pour|dans|avec|une|sur|au|aux)\b", re.IGNORECASE)
+_EN_WORDS = re.compile(r"\b(the|and|of|for|with|is|in|to|on|by|are|from)\b", re.IGNORECASE)
 
-            # Group words by line (y position)
-            lines = {}
-            for w in words:
-                y = round(w['top'] / 5) * 5  # bucket by ~5px
-                lines.setdefault(y, []).append(w)
+# Only GOOD_SECTIONS split the text; longest first so "Dosage recommandé" wins over "Dosage"
+_HEADER_ALT = "|".join(re.escape(h) for h in sorted(GOOD_SECTIONS, key=lambda h: (-len(h), h)))
+_HEADER_RE  = re.compile(rf'(?im)^({_HEADER_ALT})\s*:?\s*$|^({_HEADER_ALT})\s*:')
 
-            # Sort lines top to bottom
-            for y in sorted(lines.keys()):
-                row_words = sorted(lines[y], key=lambda w: w['x0'])
+_PRODUCT_RE   = re.compile(r'BVZyme\s+[\w\d®\s]+')
+_PRODUCT_STOP = ["Bakery", "Product", "Enzyme", "Technical"]
+_FILENAME_SEP = re.compile(r'[_\-]+')
+_PARA_SPLIT   = re.compile(r'\n{2,}')
+_NEWLINES     = re.compile(r'\n+')
+_MULTI_SPACE  = re.compile(r'\s{2,}')
 
-                # Separate left-column words from right-column (header/address) words
-                left_words  = [w['text'] for w in row_words if w['x0'] < page_mid * 1.1]
-                right_words = [w['text'] for w in row_words if w['x0'] >= page_mid * 1.1]
 
-                # Only keep left column (main content)
-                # Right column is usually address/logo noise on these PDFs
-                line_text = " ".join(left_words).strip()
-                if line_text:
-                    lines_out.append(line_text)
+class RuleStats:
+    """Per-rule hit counts and time spent per pipeline stage."""
 
-    return "\n".join(lines_out)
+    def __init__(self):
+        self.rule_hits   = Counter()        # NOISE_LINES pattern → lines dropped
+        self.stage_time  = defaultdict(float)
+        self.stage_calls = Counter()
+
+    def add_time(self, stage: str, seconds: float):
+        self.stage_time[stage]  += seconds
+        self.stage_calls[stage] += 1
+
+    def reset(self):
+        self.__init__()
+
+    def as_dict(self) -> dict:
+        return {"rule_hits":   dict(self.rule_hits),
+                "stage_time":  dict(self.stage_time),
+                "stage_calls": dict(self.stage_calls)}
+
+    def merge(self, other: dict):
+        self.rule_hits.update(other["rule_hits"])
+        for stage, seconds in other["stage_time"].items():
+            self.stage_time[stage] += seconds
+        self.stage_calls.update(other["stage_calls"])
+
+    def report(self) -> str:
+        lines = ["📊 Stage timings:"]
+        for stage, seconds in sorted(self.stage_time.items(), key=lambda kv: -kv[1]):
+            calls = self.stage_calls[stage]
+            lines.append(f"   {stage:<10} {seconds:8.3f}s  ({calls} calls, "
+                         f"{1000 * seconds / max(calls, 1):.2f} ms/call)")
+        lines.append("📊 Noise rule hits:")
+        for rule, hits in self.rule_hits.most_common():
+            lines.append(f"   {hits:6d}  {rule}")
+        return "\n".join(lines)
+
+
+RULE_STATS = RuleStats()
 
 
 # ── Remove noise lines ────────────────────────────────────────────────────────
 def clean_lines(text: str) -> str:
+    t0      = time.perf_counter()
+    hits    = RULE_STATS.rule_hits
     cleaned = []
     for line in text.splitlines():
         line = line.strip()
         if not line:
             continue
         # Skip if matches any noise pattern
-        skip = False
-        for pat in NOISE_LINES:
-            if re.search(pat, line, re.IGNORECASE):
-                skip = True
-                break
-        if not skip and len(line) > 2:
+        rule = _noise_rule(line)
+        if rule is not None:
+            hits[rule] += 1
+        elif len(line) > 2:
             cleaned.append(line)
+        else:
+            hits["<= 2 chars"] += 1
+    RULE_STATS.add_time("clean", time.perf_counter() - t0)
     return "\n".join(cleaned)
 
 
 # ── Detect product name ───────────────────────────────────────────────────────
+def _head_lines(text: str, n: int) -> list[str]:
+    """text.splitlines()[:n] without splitting the whole document."""
+    pos = -1
+    for _ in range(n + 1):
+        pos = text.find("\n", pos + 1)
+        if pos < 0:
+            return text.splitlines()[:n]
+    return text[:pos + 1].splitlines()[:n]
+
+
 def get_product_name(text: str, filename: str) -> str:
-    match = re.search(r'BVZyme\s+[\w\d®\s]+', text)
-    if match:
-        name = match.group(0).strip()
-        # Trim at first known section keyword
-        for kw in ["Bakery", "Product", "Enzyme", "Technical"]:
-            if kw in name:
-                name = name[:name.index(kw)].strip()
-        if len(name) > 3:
-            return name
-    for line in text.splitlines()[:6]:
-        line = line.strip()
-        if 4 < len(line) < 55:
-            return line
-    return re.sub(r'[_\-]+', ' ', os.path.splitext(filename)[0]).strip()
+    t0 = time.perf_counter()
+    try:
+        match = _PRODUCT_RE.search(text)
+        if match:
+            name = match.group(0).strip()
+            # Trim at first known section keyword
+            for kw in _PRODUCT_STOP:
+                if kw in name:
+                    name = name[:name.index(kw)].strip()
+            if len(name) > 3:
+                return name
+        for line in _head_lines(text, 6):
+            line = line.strip()
+            if 4 < len(line) < 55:
+                return line
+        return _FILENAME_SEP.sub(' ', os.path.splitext(filename)[0]).strip()
+    finally:
+        RULE_STATS.add_time("product", time.perf_counter() - t0)
 
 
 # ── Section-based chunking ────────────────────────────────────────────────────
 def chunk_sections(text: str, product_name: str) -> list[str]:
-    header_pattern = "|".join(re.escape(h) for h in
-                               ["Product Description", "Effective material",
-                                "Application", "Function", "Dosage", "Activity",
-                                "Allergens", "Storage", "Description du produit",
-                                "Matière active", "Fonction", "Dosage recommandé",
-                                "Allergènes", "Conservation"])
+    return [chunk for _, chunk in section_chunks(text, product_name)]
+
+
+def section_chunks(text: str, product_name: str) -> list[tuple[str | None, str]]:
+    """chunk_sections() with the header each chunk came from (None for fallback paragraphs)."""
+    t0 = time.perf_counter()
+    try:
+        return _chunk_sections(text, product_name)
+    finally:
+        RULE_STATS.add_time("chunk", time.perf_counter() - t0)
+
 
-    pattern = re.compile(rf'(?im)^({header_pattern})\s*:?\s*$|^({header_pattern})\s*:', )
-    parts   = pattern.split(text)
+def detect_language(text: str, header: str | None = None) -> str | None:
+    """'fr' / 'en' from the section header when known, else from common function words."""
+    if header is not None and header.lower() in SECTION_META:
+        return SECTION_META[header.lower()][1]
+    fr, en = len(_FR_WORDS.findall(text)), len(_EN_WORDS.findall(text))
+    if fr == en:
+        return None
+    return "fr" if fr > en else "en"
+
+
+def fragment_metadata(doc: dict) -> list[tuple]:
+    """(product, section, language, filename) for each chunk of a process_pdf() result."""
+    return [
+        (doc["product_name"],
+         SECTION_META[header.lower()][0] if header else None,
+         detect_language(chunk, header),
+         doc["pdf_file"])
+        for header, chunk in zip(doc["sections"], doc["chunks"])
+    ]
+
+
+def _chunk_sections(text: str, product_name: str) -> list[tuple[str | None, str]]:
+    # split() yields [text, header-alone-on-its-line, "header:", text, ...]
+    parts = _HEADER_RE.split(text)
 
     chunks = []
 
     if len(parts) <= 1:
         # No sections — use whole cleaned text as one chunk
-        paras = [p.strip() for p in re.split(r'\n{2,}', text) if len(p.strip()) > 30]
-        return [f"[{product_name}] {p}" for p in paras]
+        paras = [p.strip() for p in _PARA_SPLIT.split(text) if len(p.strip()) > 30]
+        return [(None, f"[{product_name}] {p}") for p in paras]
 
     i = 0
     while i < len(parts):
@@ -152,101 +482,732 @@ def chunk_sections(text: str, product_name: str) -> list[str]:
             i += 1
             continue
 
-        # Check if this part is a section header
-        if part.lower() in GOOD_SECTIONS:
-            header  = part
-            content = parts[i + 1].strip() if i + 1 < len(parts) else ""
-            content = re.sub(r'\n+', ' ', content).strip()
-            content = re.sub(r'\s{2,}', ' ', content)
+        kind = SECTION_MAP.get(part.lower())
+        if kind == "keep":
+            header = part
+            # Content is the next text part (after the unused group of a header-alone line)
+            j = i + 1
+            while j < len(parts) and parts[j] is None:
+                j += 1
+            content = parts[j].strip() if j < len(parts) else ""
+            content = _NEWLINES.sub(' ', content).strip()
+            content = _MULTI_SPACE.sub(' ', content)
 
             if content and len(content) > 8:
                 chunk = f"[{product_name}] {header}: {content}"
                 if len(chunk) > 650:
                     chunk = chunk[:647] + "..."
-                chunks.append(chunk)
-            i += 2
-        elif part.lower() in SKIP_SECTIONS:
+                chunks.append((header, chunk))
+            i = j + 1
+        elif kind == "skip":
             i += 2  # skip header + content
         else:
             i += 1
 
     if not chunks:
         # Fallback: cleaned text paragraph by paragraph
-        for para in re.split(r'\n', text):
+        for para in text.split('\n'):
             para = para.strip()
             if len(para) > 30:
-                chunks.append(f"[{product_name}] {para}")
+                chunks.append((None, f"[{product_name}] {para}"))
 
     return chunks
 
 
-# ── MAIN ─────────────────────────────────────────────────────────────────────
-def main():
-    pdf_files = sorted([f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf")])
-    if not pdf_files:
-        print(f"⚠️  No PDF files found in '{PDF_FOLDER}/'.")
+# ── Batched embedding ─────────────────────────────────────────────────────────
+def embed_chunks(model, texts: list[str],
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 sort_by_length: bool = INGEST_SORT_BY_LENGTH,
+                 pool=None) -> np.ndarray:
+    """
+    Encode chunks in batches and return a (len(texts), dim) float32 matrix
+    in the original order.
+
+    With sort_by_length, chunks are encoded shortest-first so each batch pads
+    to a similar length. When a sentence-transformers multi-process pool
+    (model.start_multi_process_pool) is given, the work is spread over it.
+    """
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    order = np.argsort([len(t) for t in texts], kind="stable") if sort_by_length \
+        else np.arange(len(texts))
+    ordered = [texts[i] for i in order]
+
+    if pool is not None:
+        encoded = model.encode_multi_process(ordered, pool, batch_size=batch_size)
+    else:
+        encoded = np.vstack([
+            model.encode(ordered[i:i + batch_size], batch_size=batch_size,
+                         convert_to_numpy=True, show_progress_bar=False)
+            for i in range(0, len(ordered), batch_size)
+        ])
+
+    vectors = np.empty_like(encoded, dtype=np.float32)
+    vectors[order] = encoded
+    return vectors
+
+
+# ── Bulk loading ──────────────────────────────────────────────────────────────
+_COPY_HEADER  = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+# Fragment metadata columns, in the order of BulkLoader's `meta` tuples
+META_COLUMNS  = ("product", "section", "language", "filename")
+_COPY_COLUMNS = f"embeddings (id_document, texte_fragment, vecteur, {', '.join(META_COLUMNS)})"
+
+
+def _copy_text_escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class BulkLoader:
+    """
+    Stream (id_document, texte_fragment, vecteur, metadata) rows into
+    `embeddings`, metadata being a (product, section, language, filename)
+    tuple (any of them None).
+
+    Rows are buffered and flushed every `batch_size` rows with one round
+    trip each, and the transaction is committed every `commit_every` rows:
+      - "copy_binary" : COPY ... FROM STDIN (FORMAT binary); vectors are sent
+                        as big-endian float4 straight from NumPy, no text at all
+      - "copy_text"   : COPY ... FROM STDIN in text format
+      - "values"      : multi-row INSERT via psycopg2 execute_values
+    """
+
+    METHODS = ("copy_binary", "copy_text", "values")
+
+    def __init__(self, conn, method: str = INGEST_LOAD_METHOD,
+                 batch_size: int = INGEST_LOAD_BATCH,
+                 commit_every: int | None = INGEST_COMMIT_EVERY):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown load method: {method!r} (choose from {self.METHODS})")
+        self.conn         = conn
+        self.method       = method
+        self.batch_size   = batch_size
+        self.commit_every = commit_every
+        self.rows_written = 0
+        self._since_commit = 0
+        self._buffer = []
+
+    def add(self, doc_id: int, chunk: str, vector, meta: tuple = (None,) * len(META_COLUMNS)):
+        self._buffer.append((doc_id, chunk, vector, *meta))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, rows):
+        """Rows of (doc_id, chunk, vector) or (doc_id, chunk, vector, meta)."""
+        for row in rows:
+            self.add(*row)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        with self.conn.cursor() as cur:
+            if self.method == "copy_binary":
+                cur.copy_expert(f"COPY {_COPY_COLUMNS} FROM STDIN WITH (FORMAT binary)",
+                                io.BytesIO(self._encode_binary(rows)))
+            elif self.method == "copy_text":
+                cur.copy_expert(f"COPY {_COPY_COLUMNS} FROM STDIN",
+                                io.StringIO(self._encode_text(rows)))
+            else:
+                execute_values(cur,
+                               f"INSERT INTO {_COPY_COLUMNS} VALUES %s",
+                               rows, page_size=len(rows))
+        self.rows_written  += len(rows)
+        self._since_commit += len(rows)
+        if self.commit_every and self._since_commit >= self.commit_every:
+            self.conn.commit()
+            self._since_commit = 0
+
+    def close(self):
+        """Flush what is left and commit."""
+        self.flush()
+        self.conn.commit()
+        self._since_commit = 0
+
+    @staticmethod
+    def _encode_binary(rows) -> bytes:
+        parts = [_COPY_HEADER]
+        for doc_id, chunk, vector, *meta in rows:
+            text = chunk.encode("utf-8")
+            vec  = np.asarray(vector, dtype=">f4")
+            # pgvector binary input: int16 dim, int16 unused, dim × float4
+            vec_bytes = struct.pack("!hh", vec.shape[0], 0) + vec.tobytes()
+            parts.append(struct.pack("!hii", 3 + len(meta), 4, doc_id))
+            parts.append(struct.pack("!i", len(text)))
+            parts.append(text)
+            parts.append(struct.pack("!i", len(vec_bytes)))
+            parts.append(vec_bytes)
+            for value in meta:
+                if value is None:
+                    parts.append(struct.pack("!i", -1))   # NULL
+                else:
+                    data = value.encode("utf-8")
+                    parts.append(struct.pack("!i", len(data)))
+                    parts.append(data)
+        parts.append(_COPY_TRAILER)
+        return b"".join(parts)
+
+    @staticmethod
+    def _encode_text(rows) -> str:
+        lines = []
+        for doc_id, chunk, vector, *meta in rows:
+            # 9 significant digits round-trip any float32 exactly (7 can change the last bit)
+            vec = "[" + ",".join(f"{x:.9g}" for x in np.asarray(vector, dtype=np.float32)) + "]"
+            fields = [str(doc_id), _copy_text_escape(chunk), vec]
+            fields += ["\\N" if v is None else _copy_text_escape(v) for v in meta]
+            lines.append("\t".join(fields) + "\n")
+        return "".join(lines)
+
+
+# ── Incremental ingestion: per-document tracking ─────────────────────────────
+def ensure_schema(cur):
+    """Create the embeddings / documents tables and their plain indexes."""
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            id             SERIAL PRIMARY KEY,
+            id_document    INT,
+            texte_fragment TEXT,
+            vecteur        VECTOR(384)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id_document      SERIAL PRIMARY KEY,
+            filename         TEXT UNIQUE NOT NULL,
+            content_hash     TEXT,              -- NULL until successfully ingested
+            mtime            DOUBLE PRECISION,
+            pipeline_version TEXT,
+            product_name     TEXT,
+            n_chunks         INT,
+            updated_at       TIMESTAMPTZ DEFAULT now()
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS embeddings_id_document_idx "
+                "ON embeddings (id_document);")
+    # Fragment metadata, filled at ingestion (PIPELINE_VERSION 4 re-processes older rows)
+    for column in META_COLUMNS:
+        cur.execute(f"ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS {column} TEXT;")
+    # text_pattern_ops also serves prefix filters such as product LIKE 'BVZyme TG%'
+    cur.execute("CREATE INDEX IF NOT EXISTS embeddings_product_idx "
+                "ON embeddings (product text_pattern_ops);")
+    cur.execute("CREATE INDEX IF NOT EXISTS embeddings_section_idx ON embeddings (section);")
+    cur.execute("CREATE INDEX IF NOT EXISTS embeddings_language_idx ON embeddings (language);")
+    cur.execute("CREATE INDEX IF NOT EXISTS embeddings_filename_idx ON embeddings (filename);")
+
+
+def _pipeline_version() -> str:
+    # The embedding model is part of the pipeline: changing it invalidates every vector
+    return f"{PIPELINE_VERSION}:{model_key()}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def plan_ingestion(cur, pdf_files: list[str], force: bool = False) -> dict:
+    """
+    Compare the PDF folder with the documents table.
+
+    A file is unchanged when its pipeline version matches and either its
+    mtime is the same or (after a touch / copy) its SHA-256 still matches.
+    Everything else is new or changed. Ids of known files are kept, and new
+    files get an id right away, so id_document is stable across runs.
+
+    Returns:
+        { 'jobs': [(doc_id, pdf_file)], 'added': [...], 'changed': [...],
+          'removed': [(doc_id, filename)], 'unchanged': [...], 'hashes': {file: (sha, mtime)} }
+    """
+    version = _pipeline_version()
+    cur.execute("SELECT id_document, filename, content_hash, mtime, pipeline_version "
+                "FROM documents;")
+    known = {row[1]: row for row in cur.fetchall()}
+
+    plan = {"jobs": [], "added": [], "changed": [], "removed": [], "unchanged": [], "hashes": {}}
+    for pdf_file in pdf_files:
+        path  = os.path.join(PDF_FOLDER, pdf_file)
+        mtime = os.path.getmtime(path)
+        row   = known.get(pdf_file)
+
+        if row and not force and row[2] and row[4] == version:
+            if row[3] == mtime:
+                plan["unchanged"].append(pdf_file)
+                continue
+            sha = file_sha256(path)
+            if sha == row[2]:
+                cur.execute("UPDATE documents SET mtime = %s WHERE id_document = %s;",
+                            (mtime, row[0]))
+                plan["unchanged"].append(pdf_file)
+                continue
+        else:
+            sha = file_sha256(path)
+        plan["hashes"][pdf_file] = (sha, mtime)
+
+        if row:
+            plan["changed"].append(pdf_file)
+            plan["jobs"].append((row[0], pdf_file))
+        else:
+            cur.execute("INSERT INTO documents (filename) VALUES (%s) RETURNING id_document;",
+                        (pdf_file,))
+            plan["added"].append(pdf_file)
+            plan["jobs"].append((cur.fetchone()[0], pdf_file))
+
+    present = set(pdf_files)
+    plan["removed"] = [(row[0], name) for name, row in known.items() if name not in present]
+    return plan
+
+
+def delete_orphans(cur):
+    """Drop fragments with no documents row (loaded before documents were tracked)."""
+    cur.execute("""
+        DELETE FROM embeddings e
+        WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.id_document = e.id_document);
+    """)
+
+
+def apply_removals(cur, plan: dict):
+    """
+    Delete fragments of removed documents and of every document about to be
+    re-processed. The jobs lose their content_hash in the same transaction:
+    if one fails or the run stops before mark_document_done(), the next run
+    sees it as changed and retries it instead of keeping it at 0 fragments.
+    """
+    removed_ids = [doc_id for doc_id, _ in plan["removed"]]
+    job_ids     = [doc_id for doc_id, _ in plan["jobs"]]
+    stale_ids   = removed_ids + job_ids
+    if stale_ids:
+        cur.execute("DELETE FROM embeddings WHERE id_document = ANY(%s);", (stale_ids,))
+    if job_ids:
+        cur.execute("UPDATE documents SET content_hash = NULL WHERE id_document = ANY(%s);",
+                    (job_ids,))
+    if removed_ids:
+        cur.execute("DELETE FROM documents WHERE id_document = ANY(%s);", (removed_ids,))
+
+
+def mark_document_done(cur, doc: dict, plan: dict):
+    sha, mtime = plan["hashes"][doc["pdf_file"]]
+    cur.execute("""
+        UPDATE documents
+        SET content_hash = %s, mtime = %s, pipeline_version = %s,
+            product_name = %s, n_chunks = %s, updated_at = now()
+        WHERE id_document = %s;
+    """, (sha, mtime, _pipeline_version(), doc["product_name"],
+          len(doc["chunks"]), doc["doc_id"]))
+
+
+def vector_index_exists(cur) -> bool:
+    """True if the ANN index for the current COMPACT_VECTORS setting exists."""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (vector_index_name(),))
+    return cur.fetchone()[0]
+
+
+# ── NumPy export (SEARCH_BACKEND = "numpy") ──────────────────────────────────
+def export_numpy_index(conn, out_dir: str = NUMPY_INDEX_DIR, batch: int = 10_000) -> int:
+    """
+    Dump the embeddings table to the memory-mapped store read by Search.py.
+
+    Runs in one REPEATABLE READ snapshot, so the row count and the rows agree
+    even if another ingestion commits meanwhile, and streams through a
+    server-side cursor.
+    """
+    conn.commit()
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM embeddings;")
+            count = cur.fetchone()[0]
+        with conn.cursor(name="numpy_export") as cur:
+            cur.itersize = batch
+            cur.execute(f"SELECT id, id_document, texte_fragment, vecteur, {', '.join(META_COLUMNS)} "
+                        f"FROM embeddings ORDER BY id;")
+            rows = ((row_id, doc_id, text, VectorStore.as_numpy(vec), *meta)
+                    for row_id, doc_id, text, vec, *meta in cur)
+            written = VectorStore.write_store(out_dir, rows, count,
+                                              EMBEDDING_DIM, model_key(), META_COLUMNS)
+        conn.commit()
+    finally:
+        conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT")
+    return written
+
+
+def _export(conn, out_dir: str = NUMPY_INDEX_DIR):
+    print(f"📦 Exporting embeddings to '{out_dir}/' (NumPy backend)...")
+    t0 = time.perf_counter()
+    n  = export_numpy_index(conn, out_dir)
+    print(f"✅ {n} vectors exported in {time.perf_counter() - t0:.1f}s.\n")
+
+
+# ── Vector index management ───────────────────────────────────────────────────
+def drop_vector_index(cur):
+    """Drop the ANN index so bulk loading doesn't pay for per-row index updates."""
+    for compact in (None, *COMPACT_FORMS):
+        cur.execute(f"DROP INDEX IF EXISTS {vector_index_name(compact)};")
+
+
+def create_vector_index(cur, index_type: str | None = VECTOR_INDEX_TYPE,
+                        compact: str | None = COMPACT_VECTORS):
+    """
+    (Re)build the ANN index on embeddings.vecteur for cosine distance, or
+    on its compact form (halfvec / binary-quantized bit) when `compact` is set.
+
+    Built after the data is loaded: HNSW/IVFFlat builds are much faster on a
+    full table, and IVFFlat needs the data to pick its list centroids.
+    """
+    drop_vector_index(cur)
+    if index_type is None:
         return
 
+    if compact is None:
+        target = "(vecteur vector_cosine_ops)"
+    elif compact in COMPACT_FORMS:
+        expression, opclass, _ = COMPACT_FORMS[compact]
+        target = f"(({expression.format(v='vecteur')}) {opclass})"
+    else:
+        raise ValueError(f"Unknown COMPACT_VECTORS: {compact!r} (choose from {tuple(COMPACT_FORMS)})")
+    name = vector_index_name(compact)
+
+    if index_type == "hnsw":
+        cur.execute(
+            f"CREATE INDEX {name} ON embeddings "
+            f"USING hnsw {target} "
+            f"WITH (m = {int(HNSW_M)}, ef_construction = {int(HNSW_EF_CONSTRUCTION)});"
+        )
+    elif index_type == "ivfflat":
+        lists = IVFFLAT_LISTS
+        if lists is None:
+            cur.execute("SELECT COUNT(*) FROM embeddings;")
+            rows  = cur.fetchone()[0]
+            lists = int(rows ** 0.5) if rows > 1_000_000 else max(10, rows // 1000)
+        cur.execute(
+            f"CREATE INDEX {name} ON embeddings "
+            f"USING ivfflat {target} WITH (lists = {int(lists)});"
+        )
+    else:
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {index_type!r}")
+
+    cur.execute("ANALYZE embeddings;")
+
+
+# ── Per-document extraction (runs in worker processes) ───────────────────────
+def process_pdf(doc_id: int, pdf_file: str, extract_mode: str = INGEST_EXTRACT_MODE) -> dict:
+    """
+    extract_text → clean_lines → get_product_name → chunk_sections for one PDF.
+
+    Top-level so it can run in a ProcessPoolExecutor. Never raises: a
+    malformed PDF comes back with 'error' set so the run keeps going.
+    The document's rule/stage statistics are returned under 'stats'.
+    """
+    RULE_STATS.reset()
+    result = {"doc_id": doc_id, "pdf_file": pdf_file,
+              "product_name": None, "chunks": [], "sections": [], "error": None}
+    try:
+        t0   = time.perf_counter()
+        raw  = extract_text(os.path.join(PDF_FOLDER, pdf_file), extract_mode)
+        RULE_STATS.add_time("extract", time.perf_counter() - t0)
+        text = clean_lines(raw)
+        if text:
+            result["product_name"] = get_product_name(text, pdf_file)
+            pairs = section_chunks(text, result["product_name"])
+            result["sections"] = [header for header, _ in pairs]
+            result["chunks"]   = [chunk for _, chunk in pairs]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["stats"] = RULE_STATS.as_dict()
+    return result
+
+
+def iter_documents(jobs: list[tuple[int, str]], workers: int = INGEST_EXTRACT_WORKERS,
+                   extract_mode: str = INGEST_EXTRACT_MODE):
+    """
+    Yield process_pdf() results for every (doc_id, pdf_file) job.
+
+    Document ids are assigned before extraction (from the documents table),
+    so they do not depend on which worker finishes first. With workers > 1
+    (0 = one per CPU) the files are fanned out over a process pool and
+    yielded as they complete.
+    """
+    if workers == 1:
+        return (process_pdf(doc_id, pdf_file, extract_mode) for doc_id, pdf_file in jobs)
+
+    # Submitted right away (not lazily) so extraction overlaps model loading
+    executor = ProcessPoolExecutor(max_workers=workers or None)
+    futures  = {executor.submit(process_pdf, doc_id, pdf_file, extract_mode): (doc_id, pdf_file)
+                for doc_id, pdf_file in jobs}
+    return _completed_documents(executor, futures)
+
+
+def _completed_documents(executor, futures):
+    try:
+        for future in as_completed(futures):
+            doc_id, pdf_file = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:   # worker crashed (e.g. segfault in a PDF lib)
+                yield {"doc_id": doc_id, "pdf_file": pdf_file, "product_name": None,
+                       "chunks": [], "sections": [], "error": f"{type(e).__name__}: {e}",
+                       "stats": RuleStats().as_dict()}
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+# ── MAIN ─────────────────────────────────────────────────────────────────────
+def export_metrics(stats: RuleStats, chunks: int, documents: int, failed: int,
+                   cache_stats: dict | None = None):
+    """
+    Per-stage figures of this run (extract, clean, product, chunk, encode,
+    insert) and embedding-cache reuse as Prometheus gauges in METRICS_FILE
+    and, with METRICS_LOG, one JSON log line.
+    """
+    for stage, seconds in stats.stage_time.items():
+        Metrics.set_gauge("rag_ingest_stage_seconds", round(seconds, 6), stage=stage)
+        Metrics.set_gauge("rag_ingest_stage_calls", stats.stage_calls[stage], stage=stage)
+    Metrics.set_gauge("rag_ingest_chunks", chunks)
+    Metrics.set_gauge("rag_ingest_documents", documents, outcome="ok")
+    Metrics.set_gauge("rag_ingest_documents", failed, outcome="failed")
+    Metrics.set_gauge("rag_ingest_last_run_timestamp_seconds", round(time.time(), 3))
+    if cache_stats:
+        for source in ("cache_hits", "duplicates", "encoded"):
+            Metrics.set_gauge("rag_ingest_embeddings", cache_stats[source], source=source)
+        Metrics.set_gauge("rag_ingest_dedup_ratio", cache_stats["dedup_ratio"])
+    if METRICS_LOG:
+        Metrics.log_event({
+            "event":     "ingestion",
+            "chunks":    chunks,
+            "documents": documents,
+            "failed":    failed,
+            "stages":    {stage: {"ms": round(1000 * seconds, 3), "calls": stats.stage_calls[stage]}
+                          for stage, seconds in stats.stage_time.items()},
+            **({"embed_cache": cache_stats} if cache_stats else {}),
+        })
+    if METRICS_FILE:
+        Metrics.write_prometheus_file(METRICS_FILE)
+        print(f"📈 Metrics written to {METRICS_FILE}\n")
+
+
+def main(batch_size: int = INGEST_BATCH_SIZE,
+         sort_by_length: bool = INGEST_SORT_BY_LENGTH,
+         encode_processes: int = INGEST_ENCODE_PROCESSES,
+         load_method: str = INGEST_LOAD_METHOD,
+         workers: int = INGEST_EXTRACT_WORKERS,
+         stream_chunks: int = INGEST_STREAM_CHUNKS,
+         force: bool = False,
+         extract_mode: str = INGEST_EXTRACT_MODE,
+         export_numpy: bool = SEARCH_BACKEND == "numpy",
+         reindex: bool = False,
+         embed_cache: str | None = INGEST_EMBED_CACHE_PATH):
+    pdf_files = sorted([f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf")])
     print(f"📂 {len(pdf_files)} PDF(s) found\n")
-    print(f"🔄 Loading model '{EMBEDDING_MODEL}'...")
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    print("✅ Model loaded.\n")
 
     print("🔌 Connecting to PostgreSQL...")
     conn = psycopg2.connect(**DB_CONFIG)
     print("✅ Connected.\n")
 
     with conn.cursor() as cur:
-        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS embeddings (
-                id             SERIAL PRIMARY KEY,
-                id_document    INT,
-                texte_fragment TEXT,
-                vecteur        VECTOR(384)
-            );
-        """)
-        cur.execute("TRUNCATE TABLE embeddings RESTART IDENTITY;")
-        print("🗑️  Table cleared.\n")
-
-        total = 0
-
-        for doc_id, pdf_file in enumerate(pdf_files, start=1):
-            print(f"📄 [{doc_id}/{len(pdf_files)}] {pdf_file}")
-
-            raw   = extract_text(os.path.join(PDF_FOLDER, pdf_file))
-            text  = clean_lines(raw)
-
-            if not text:
-                print("   ⚠️  No usable text, skipping.\n")
-                continue
+        ensure_schema(cur)
+        register_vector(conn)   # NumPy arrays → vector parameters, no manual string building
+
+        delete_orphans(cur)
+        plan = plan_ingestion(cur, pdf_files, force=force)
+        print(f"🔎 {len(plan['added'])} new · {len(plan['changed'])} changed · "
+              f"{len(plan['removed'])} removed · {len(plan['unchanged'])} unchanged"
+              f"{' (forced rebuild)' if force else ''}\n")
 
-            product_name = get_product_name(text, pdf_file)
-            print(f"   🏷️  Product : {product_name}")
-
-            chunks = chunk_sections(text, product_name)
-            print(f"   ✂️  {len(chunks)} chunks:")
-            for i, chunk in enumerate(chunks, 1):
-                preview = chunk[:100].replace('\n', ' ')
-                print(f"      {i}. {preview}...")
-                vec = model.encode(chunk).tolist()
-                vec_str = "[" + ",".join(map(str, vec)) + "]"
-                cur.execute(
-                    "INSERT INTO embeddings (id_document, texte_fragment, vecteur) "
-                    "VALUES (%s, %s, %s::vector);",
-                    (doc_id, chunk, vec_str)
-                )
-
-            total += len(chunks)
-            print()
+        cur.execute("SELECT COUNT(*) FROM documents WHERE content_hash IS NOT NULL;")
+        indexed_docs = cur.fetchone()[0]
+        # Rebuilding the ANN index after a bulk load beats updating it row by row,
+        # but for a handful of changed files the existing index is kept.
+        rebuild_index = bool(VECTOR_INDEX_TYPE) and (
+            reindex or not vector_index_exists(cur)
+            or len(plan["jobs"]) > 0.5 * max(indexed_docs, 1))
 
+        apply_removals(cur, plan)
         conn.commit()
+        for doc_id, name in plan["removed"]:
+            print(f"🗑️  Removed #{doc_id} {name}")
+
+        if not plan["jobs"]:
+            if rebuild_index:
+                # Index missing, or built for another COMPACT_VECTORS setting
+                print(f"🧭 Building {VECTOR_INDEX_TYPE} index '{vector_index_name()}'...")
+                create_vector_index(cur)
+                conn.commit()
+                print("✅ Index ready.\n")
+            index_missing = not os.path.exists(os.path.join(NUMPY_INDEX_DIR, VectorStore.META))
+            if export_numpy and (plan["removed"] or index_missing):
+                _export(conn)
+            conn.close()
+            print("=" * 55)
+            print("✅ Nothing to ingest — corpus is up to date.")
+            return
+
+        workers_label = f" — extracting with {workers or os.cpu_count()} workers" if workers != 1 else ""
+        print(f"📄 Processing {len(plan['jobs'])} PDF(s){workers_label}\n")
+        # Start extraction first: pool workers fork before the model is loaded
+        documents = iter_documents(plan["jobs"], workers, extract_mode)
+
+        if EMBED_SERVER_URL:
+            print(f"🔄 Using the embedding server {EMBED_SERVER_URL} for '{model_key()}'...")
+        else:
+            print(f"🔄 Loading model '{model_key()}'...")
+        model = load_embedding_model()
+        encode_pool = None
+        if encode_processes and encode_processes > 1:
+            if hasattr(model, "start_multi_process_pool"):
+                encode_pool = model.start_multi_process_pool(target_devices=["cpu"] * encode_processes)
+            elif EMBED_SERVER_URL:
+                print("⚠️  --processes is ignored with EMBED_SERVER_URL (the server encodes).")
+            else:
+                print("⚠️  --processes only applies to the torch backend "
+                      "(ONNX Runtime already uses ONNX_THREADS cores).")
+        print("✅ Model loaded.\n")
+        # Keyed on model_key(): vectors of another backend/quantization are never reused
+        cache = ChunkEmbeddingCache(embed_cache) if embed_cache else None
+
+        if rebuild_index:
+            drop_vector_index(cur)
+
+        loader   = BulkLoader(conn, method=load_method)
+        pending  = []   # (doc_id, chunk, metadata) waiting to be encoded + loaded
+        awaiting = []   # documents whose chunks are in `pending`
+        failed   = []
+        stats    = RuleStats()   # aggregated over documents (possibly from worker processes)
+        encode_time = load_time = 0.0
+
+        def flush_pending():
+            nonlocal pending, awaiting, encode_time, load_time
+            if pending:
+                t0 = time.perf_counter()
+                vectors = embed_with_cache(
+                    cache, model_key(), [chunk for _, chunk, _ in pending],
+                    lambda texts: embed_chunks(model, texts, batch_size, sort_by_length, encode_pool))
+                t1 = time.perf_counter()
+                loader.add_many((doc_id, chunk, vec, meta)
+                                for (doc_id, chunk, meta), vec in zip(pending, vectors))
+                loader.flush()
+                t2 = time.perf_counter()
+                encode_time += t1 - t0
+                load_time   += t2 - t1
+                stats.add_time("encode", t1 - t0)
+                stats.add_time("insert", t2 - t1)
+            # Recorded in the same transaction as the fragments they describe
+            for doc in awaiting:
+                mark_document_done(cur, doc, plan)
+            pending, awaiting = [], []
+
+        try:
+            for done, doc in enumerate(documents, start=1):
+                print(f"📄 [{done}/{len(plan['jobs'])}] #{doc['doc_id']} {doc['pdf_file']}")
+                stats.merge(doc["stats"])
+
+                if doc["error"]:
+                    # content_hash stays NULL → retried on the next run
+                    print(f"   ❌ Failed: {doc['error']} — skipping.\n")
+                    failed.append(doc["pdf_file"])
+                    continue
+                if not doc["chunks"]:
+                    print("   ⚠️  No usable text, skipping.\n")
+                    awaiting.append(doc)
+                    continue
+
+                print(f"   🏷️  Product : {doc['product_name']}")
+                print(f"   ✂️  {len(doc['chunks'])} chunks:")
+                metadata = fragment_metadata(doc)
+                for i, (chunk, meta) in enumerate(zip(doc["chunks"], metadata), 1):
+                    preview = chunk[:100].replace('\n', ' ')
+                    print(f"      {i}. {preview}...")
+                    pending.append((doc["doc_id"], chunk, meta))
+                awaiting.append(doc)
+                print()
+
+                if len(pending) >= stream_chunks:
+                    flush_pending()
+
+            flush_pending()
+            loader.close()
+        finally:
+            if encode_pool is not None:
+                model.stop_multi_process_pool(encode_pool)
+            cache_stats = None
+            if cache is not None:
+                cache_stats = cache.stats()
+                cache.prune()
+                cache.close()
+
+        total = loader.rows_written
+        rate  = total / encode_time if encode_time > 0 else 0.0
+        print(f"⚡ {total} chunks encoded in {encode_time:.1f}s → {rate:.1f} chunks/s")
+        rate  = total / load_time if load_time > 0 else 0.0
+        print(f"⚡ {total} rows loaded ({load_method}) in {load_time:.1f}s → {rate:.0f} rows/s\n")
+        if cache_stats:
+            print(f"♻️  Embedding cache: {cache_stats['cache_hits']} reused · "
+                  f"{cache_stats['duplicates']} duplicates · {cache_stats['encoded']} encoded "
+                  f"→ dedup ratio {cache_stats['dedup_ratio']:.1%} ({cache_stats['size']} cached)\n")
+        print(stats.report() + "\n")
+        export_metrics(stats, total, len(plan["jobs"]) - len(failed), len(failed), cache_stats)
+
+        if rebuild_index:
+            print(f"🧭 Building {VECTOR_INDEX_TYPE} index '{vector_index_name()}'...")
+            create_vector_index(cur)
+            print("✅ Index ready.\n")
+
+        conn.commit()
+
+    if export_numpy:
+        _export(conn)
 
     conn.close()
     print("=" * 55)
-    print(f"✅ Done! {total} clean chunks inserted from {len(pdf_files)} PDF(s).")
+    print(f"✅ Done! {total} clean chunks inserted from {len(plan['jobs'])} PDF(s).")
+    if failed:
+        print(f"⚠️  {len(failed)} PDF(s) failed: {', '.join(failed)}")
     print("🚀 Run: streamlit run app.py")
 
 
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Ingest PDF datasheets into pgvector.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE,
+                        help="chunks per encode batch")
+    parser.add_argument("--no-sort", action="store_true",
+                        help="keep document order instead of length-sorting chunks")
+    parser.add_argument("--processes", type=int, default=INGEST_ENCODE_PROCESSES,
+                        help="encode with a multi-process pool of this size")
+    parser.add_argument("--load-method", choices=BulkLoader.METHODS, default=INGEST_LOAD_METHOD,
+                        help="how rows are written to PostgreSQL")
+    parser.add_argument("--workers", type=int, default=INGEST_EXTRACT_WORKERS,
+                        help="PDF extraction processes (0 = one per CPU)")
+    parser.add_argument("--extract-mode", choices=EXTRACT_MODES, default=INGEST_EXTRACT_MODE,
+                        help="PDF text extraction strategy")
+    parser.add_argument("--export-numpy", action="store_true",
+                        help="also export embeddings for the NumPy search backend "
+                             "(always on when SEARCH_BACKEND = 'numpy')")
+    parser.add_argument("--stream-chunks", type=int, default=INGEST_STREAM_CHUNKS,
+                        help="chunks gathered before each encode + load round")
+    parser.add_argument("--force", action="store_true",
+                        help="re-process every PDF even if unchanged (ids are kept)")
+    parser.add_argument("--reindex", action="store_true",
+                        help="rebuild the ANN index (e.g. after changing COMPACT_VECTORS)")
+    parser.add_argument("--no-embed-cache", action="store_true",
+                        help="encode every chunk instead of reusing cached embeddings")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = _parse_args()
+    main(batch_size=args.batch_size,
+         sort_by_length=INGEST_SORT_BY_LENGTH and not args.no_sort,
+         encode_processes=args.processes,
+         load_method=args.load_method,
+         workers=args.workers,
+         stream_chunks=args.stream_chunks,
+         force=args.force,
+         extract_mode=args.extract_mode,
+         export_numpy=args.export_numpy or SEARCH_BACKEND == "numpy",
+         reindex=args.reindex,
+         embed_cache=None if args.no_embed_cache else INGEST_EMBED_CACHE_PATH)